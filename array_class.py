@@ -0,0 +1,466 @@
+import numpy as np
+
+from si_class import SiUnitQuantity, DIMENSIONLESS, dimension_product, dimension_quotient, dimension_power
+
+
+class QuantityArray(SiUnitQuantity):
+    #NumPy array of magnitudes sharing one dimension vector. Units are checked once per operation, not per element.
+    #Being a subclass of SiUnitQuantity, its reflected operators take priority, so SiUnitQuantity op QuantityArray works too.
+    __slots__ = ()
+
+    def __init__(self, magnitude = (), exponents = None):
+        #np.asarray would convert SiUnitQuantity items with __float__ and drop their units
+        if isinstance(magnitude, (list, tuple)) and any(isinstance(item, SiUnitQuantity) for item in magnitude):
+            quantities = QuantityArray.from_quantities(magnitude)
+            SiUnitQuantity.__init__(self, quantities.magnitude, exponents)
+            if exponents is not None and self._dim is not quantities._dim:
+                raise TypeError("Unit mismatch in building QuantityArray")
+            self._dim = quantities._dim
+            return
+        SiUnitQuantity.__init__(self, np.asarray(magnitude, dtype = float), exponents)
+
+    #builds an array from an iterable of SiUnitQuantity objects of the same units
+    @classmethod
+    def from_quantities(cls, quantities):
+        quantities = list(quantities)
+        if len(quantities) == 0:
+            raise ValueError("Can not find the units of an empty sequence.")
+        dimension = quantities[0]._dim if isinstance(quantities[0], SiUnitQuantity) else DIMENSIONLESS
+        for quantity in quantities:
+            if not isinstance(quantity, SiUnitQuantity) or quantity._dim is not dimension:
+                raise TypeError("Unit mismatch in building QuantityArray")
+        return cls.from_dimension(np.array([quantity.magnitude for quantity in quantities], dtype = float), dimension)
+
+    @property
+    def shape(self):
+        return self.magnitude.shape
+
+    @property
+    def size(self):
+        return self.magnitude.size
+
+    @property
+    def ndim(self):
+        return self.magnitude.ndim
+
+    def copy(self):
+        return _array(self.magnitude.copy(), self._dim)
+
+    #indexing
+    def __len__(self):
+        return len(self.magnitude)
+
+    def __iter__(self):
+        dimension = self._dim
+        for value in self.magnitude:
+            if isinstance(value, np.ndarray):
+                yield _array(value, dimension)
+            else:
+                yield _quantity(float(value), dimension)
+
+    #slices return views of the same buffer, single elements return SiUnitQuantity
+    def __getitem__(self, index):
+        value = self.magnitude[index]
+        if isinstance(value, np.ndarray):
+            return _array(value, self._dim)
+        return _quantity(float(value), self._dim)
+
+    def __setitem__(self, index, value):
+        if not isinstance(value, SiUnitQuantity):
+            if self._dim is not DIMENSIONLESS:
+                raise TypeError("Unit mismatch in assigning a non-SiUnitQuantity to QuantityArray")
+            self.magnitude[index] = value
+            return
+        if self._dim is not value._dim:
+            raise TypeError("Unit mismatch in assigning to QuantityArray")
+        self.magnitude[index] = value.magnitude
+
+    #arithmetics
+    def __add__(self, right):
+        if not isinstance(right, SiUnitQuantity):
+            if self._dim is DIMENSIONLESS:
+                return _array(self.magnitude + right, DIMENSIONLESS)
+            raise TypeError("Unit mismatch in adding QuantityArray and a non-SiUnitQuantity")
+        if self._dim is not right._dim:
+            raise TypeError("Unit mismatch in adding QuantityArray and SiUnitQuantity")
+        return _array(self.magnitude + right.magnitude, self._dim)
+
+    def __radd__(self, right):
+        return self + right
+
+
+    def __sub__(self, right):
+        if not isinstance(right, SiUnitQuantity):
+            if self._dim is DIMENSIONLESS:
+                return _array(self.magnitude - right, DIMENSIONLESS)
+            raise TypeError("Unit mismatch in substructing QuantityArray and a non-SiUnitQuantity")
+        if self._dim is not right._dim:
+            raise TypeError("Unit mismatch in substructing QuantityArray and SiUnitQuantity")
+        return _array(self.magnitude - right.magnitude, self._dim)
+
+    def __rsub__(self, right):
+        if not isinstance(right, SiUnitQuantity):
+            if self._dim is DIMENSIONLESS:
+                return _array(right - self.magnitude, DIMENSIONLESS)
+            raise TypeError("Unit mismatch in substructing QuantityArray and a non-SiUnitQuantity")
+        if self._dim is not right._dim:
+            raise TypeError("Unit mismatch in substructing QuantityArray and SiUnitQuantity")
+        return _array(right.magnitude - self.magnitude, self._dim)
+
+
+    def __mul__(self, right):
+        if not isinstance(right, SiUnitQuantity):
+            return _array(self.magnitude * right, self._dim)
+        return _array(self.magnitude * right.magnitude, dimension_product(self._dim, right._dim))
+
+    def __rmul__(self, right):
+        if not isinstance(right, SiUnitQuantity):
+            return _array(right * self.magnitude, self._dim)
+        return _array(right.magnitude * self.magnitude, dimension_product(right._dim, self._dim))
+
+    def __truediv__(self, right):
+        if not isinstance(right, SiUnitQuantity):
+            return _array(self.magnitude / right, self._dim)
+        return _array(self.magnitude / right.magnitude, dimension_quotient(self._dim, right._dim))
+
+    def __rtruediv__(self, right):
+        if not isinstance(right, SiUnitQuantity):
+            return _array(right / self.magnitude, dimension_quotient(DIMENSIONLESS, self._dim))
+        return _array(right.magnitude / self.magnitude, dimension_quotient(right._dim, self._dim))
+
+    def __pow__(self, right):
+        if isinstance(right, SiUnitQuantity):
+            if not right.is_unitless():
+                raise ValueError('Needs unitless number for a power.')
+            right = right.magnitude
+        if np.ndim(right) != 0:
+            if self._dim is not DIMENSIONLESS:
+                raise ValueError('Needs a single power for a QuantityArray with units.')
+            return _array(self.magnitude ** right, DIMENSIONLESS)
+        return _array(self.magnitude ** right, dimension_power(self._dim, right))
+
+    def __rpow__(self, right):
+        if not self.is_unitless():
+            raise ValueError('Needs unitless number for a power.')
+        if not isinstance(right, SiUnitQuantity):
+            return right ** self.magnitude
+        if not right.is_unitless():
+            raise ValueError('Needs a single power for a SiUnitQuantity with units.')
+        return _array(right.magnitude ** self.magnitude, DIMENSIONLESS)
+
+    #in place arithmetics, the results are written into the magnitude buffer. Views taken before
+    #share the buffer as in NumPy: they see the new numbers, but keep their units when *= or /= changes them.
+    def __iadd__(self, right):
+        if not isinstance(right, SiUnitQuantity):
+            if self._dim is DIMENSIONLESS:
+                self.magnitude += right
+                return self
+            raise TypeError("Unit mismatch in adding QuantityArray and a non-SiUnitQuantity")
+        if self._dim is not right._dim:
+            raise TypeError("Unit mismatch in adding QuantityArray and SiUnitQuantity")
+        self.magnitude += right.magnitude
+        return self
+
+    def __isub__(self, right):
+        if not isinstance(right, SiUnitQuantity):
+            if self._dim is DIMENSIONLESS:
+                self.magnitude -= right
+                return self
+            raise TypeError("Unit mismatch in substructing QuantityArray and a non-SiUnitQuantity")
+        if self._dim is not right._dim:
+            raise TypeError("Unit mismatch in substructing QuantityArray and SiUnitQuantity")
+        self.magnitude -= right.magnitude
+        return self
+
+    def __imul__(self, right):
+        if not isinstance(right, SiUnitQuantity):
+            self.magnitude *= right
+            return self
+        self.magnitude *= right.magnitude
+        self._dim = dimension_product(self._dim, right._dim)
+        return self
+
+    def __itruediv__(self, right):
+        if not isinstance(right, SiUnitQuantity):
+            self.magnitude /= right
+            return self
+        self.magnitude /= right.magnitude
+        self._dim = dimension_quotient(self._dim, right._dim)
+        return self
+
+    def __neg__(self):
+        return _array(-self.magnitude, self._dim)
+
+    def __pos__(self):
+        return _array(+self.magnitude, self._dim)
+
+    #equalities and inequalities, elementwise
+    def __eq__(self, other):
+        if not isinstance(other, SiUnitQuantity):
+            if self.is_unitless():
+                return self.magnitude == other
+            raise TypeError("Unit mismatch in comparing QuantityArray and a non-SiUnitQuantity")
+        if self._dim is not other._dim:
+            raise TypeError("Unit mismatch in comparing QuantityArray and SiUnitQuantity")
+        return self.magnitude == other.magnitude
+
+    def __ne__(self, other):
+        return ~(self == other)
+
+    def __lt__(self, right):  #<
+        return self.magnitude < _comparable(self, right)
+
+    def __gt__(self, right):  #>
+        return self.magnitude > _comparable(self, right)
+
+    def __le__(self, right):  #<=
+        return self.magnitude <= _comparable(self, right)
+
+    def __ge__(self, right):  #>=
+        return self.magnitude >= _comparable(self, right)
+
+    def __abs__(self):
+        return _array(np.abs(self.magnitude), self._dim)
+
+    def __round__(self, digits = 0):
+        return _array(np.round(self.magnitude, digits), self._dim)
+
+    def int_units(self):
+        quantity = SiUnitQuantity.int_units(self)
+        return _array(self.magnitude, quantity._dim)
+
+
+#returns the magnitude to compare the array with, checking the units once
+def _comparable(array, right):
+    if not isinstance(right, SiUnitQuantity):
+        if array.is_unitless():
+            return right
+        raise ValueError('Quantities with different units cannot be compared.')
+    if array._dim is right._dim:
+        return right.magnitude
+    raise ValueError('Quantities with different units cannot be compared')
+
+
+_array = QuantityArray.from_dimension
+_quantity = SiUnitQuantity.from_dimension
+
+
+##############################################################################
+
+#NumPy protocols: the dimension rule is applied once per call, the ufunc itself runs on the raw float buffers
+
+#operands must share units, the result keeps them
+_SAME_UNITS_UFUNCS = {np.add, np.subtract, np.maximum, np.minimum, np.fmax, np.fmin, np.hypot, np.remainder, np.fmod}
+
+#operands must share units, the result is a plain array
+_COMPARISON_UFUNCS = {np.less, np.less_equal, np.greater, np.greater_equal}
+_EQUALITY_UFUNCS = {np.equal, np.not_equal}
+
+_KEEP_UNITS_UFUNCS = {np.negative, np.positive, np.absolute, np.fabs, np.rint, np.floor, np.ceil, np.trunc, np.conjugate}
+
+_PLAIN_UFUNCS = {np.isnan, np.isinf, np.isfinite, np.signbit, np.sign}
+
+#argument must be unitless, so is the result
+_UNITLESS_UFUNCS = {np.exp, np.exp2, np.expm1, np.log, np.log2, np.log10, np.log1p, \
+                    np.sin, np.cos, np.tan, np.arcsin, np.arccos, np.arctan, \
+                    np.sinh, np.cosh, np.tanh, np.arcsinh, np.arccosh, np.arctanh, \
+                    np.deg2rad, np.rad2deg}
+
+_POWER_UFUNCS = {np.sqrt: 0.5, np.square: 2, np.cbrt: 1/3, np.reciprocal: -1}
+
+#ufuncs whose reduce/accumulate keep the units of the operand
+_REDUCIBLE_UFUNCS = {np.add, np.maximum, np.minimum, np.fmax, np.fmin}
+
+
+def _result_dimension(ufunc, dims, magnitudes):
+    #returns the dimension of the result, None for a plain result or NotImplemented for unsupported ufuncs
+    name = "np." + ufunc.__name__
+
+    if ufunc in _SAME_UNITS_UFUNCS or ufunc in _EQUALITY_UFUNCS or ufunc is np.arctan2:
+        if dims[0] is not dims[1]:
+            raise TypeError("Unit mismatch in " + name)
+        if ufunc is np.arctan2:
+            return DIMENSIONLESS
+        return dims[0] if ufunc in _SAME_UNITS_UFUNCS else None
+
+    if ufunc in _COMPARISON_UFUNCS:
+        if dims[0] is not dims[1]:
+            raise ValueError('Quantities with different units cannot be compared')
+        return None
+
+    if ufunc in _KEEP_UNITS_UFUNCS:
+        return dims[0]
+
+    if ufunc in _PLAIN_UFUNCS:
+        return None
+
+    if ufunc in _UNITLESS_UFUNCS:
+        if dims[0] is not DIMENSIONLESS:
+            raise ValueError("Needs unitless argument for " + name)
+        return DIMENSIONLESS
+
+    if ufunc in _POWER_UFUNCS:
+        return dimension_power(dims[0], _POWER_UFUNCS[ufunc])
+
+    if ufunc is np.multiply or ufunc is np.matmul:
+        return dimension_product(dims[0], dims[1])
+
+    if ufunc is np.divide:
+        return dimension_quotient(dims[0], dims[1])
+
+    if ufunc is np.power or ufunc is np.float_power:
+        if dims[1] is not DIMENSIONLESS:
+            raise ValueError('Needs unitless number for a power.')
+        if dims[0] is DIMENSIONLESS:
+            return DIMENSIONLESS
+        if np.ndim(magnitudes[1]) != 0:
+            raise ValueError('Needs a single power for a QuantityArray with units.')
+        return dimension_power(dims[0], float(magnitudes[1]))
+
+    return NotImplemented
+
+
+#wraps a raw NumPy result into the quantity type matching its shape. A list (np.split) is wrapped
+#item by item, of a tuple (np.unique with return_counts) only the first item is the quantity.
+def _wrap(result, dimension):
+    if dimension is None:
+        return result
+    if isinstance(result, list):
+        return [_wrap(item, dimension) for item in result]
+    if isinstance(result, tuple):
+        return (_wrap(result[0], dimension), ) + result[1:]
+    if isinstance(result, np.ndarray) and result.ndim != 0:
+        return _array(result, dimension)
+    return _quantity(float(result), dimension)
+
+
+def array_ufunc(ufunc, method, *inputs, **kwargs):
+    if method not in ("__call__", "reduce", "accumulate", "outer"):
+        return NotImplemented
+    if method in ("reduce", "accumulate") and ufunc not in _REDUCIBLE_UFUNCS:
+        return NotImplemented
+    if ufunc.nout != 1:
+        return NotImplemented
+
+    magnitudes = []
+    dims = []
+    for value in inputs:
+        if isinstance(value, SiUnitQuantity):
+            magnitudes.append(value.magnitude)
+            dims.append(value._dim)
+        else:
+            magnitudes.append(value)
+            dims.append(DIMENSIONLESS)
+
+    if method in ("reduce", "accumulate"):
+        dimension = dims[0]
+    else:
+        dimension = _result_dimension(ufunc, dims, magnitudes)
+        if dimension is NotImplemented:
+            return NotImplemented
+
+    out = kwargs.get("out")
+    if out is not None:
+        out = out[0]
+        if isinstance(out, SiUnitQuantity):
+            if out._dim is not (DIMENSIONLESS if dimension is None else dimension):
+                raise TypeError("Unit mismatch in writing the result of np." + ufunc.__name__)
+            kwargs["out"] = (out.magnitude, )
+
+    result = getattr(ufunc, method)(*magnitudes, **kwargs)
+    if isinstance(out, SiUnitQuantity):
+        return out
+    return _wrap(result, dimension)
+
+
+#rules for NumPy functions: "same" - quantity arguments share units that the result keeps,
+#"same plain" - the same check with a plain result, "square" - the square of the units,
+#"product" - the product of the units of the arguments, "plain" - no units in the result
+_FUNCTION_RULES = {}
+for _rule, _functions in (
+        ("same", ["sum", "nansum", "mean", "nanmean", "median", "nanmedian", "min", "max", "amin", "amax", \
+                  "nanmin", "nanmax", "ptp", "std", "nanstd", "cumsum", "nancumsum", "sort", "diff", "round", \
+                  "around", "abs", "absolute", "clip", "percentile", "nanpercentile", "quantile", "nanquantile", \
+                  "copy", "ravel", "reshape", "transpose", "squeeze", "flip", "roll", "concatenate", "stack", \
+                  "hstack", "vstack", "where", "zeros_like", "ones_like", "empty_like", "full_like", \
+                  "split", "array_split", "unique", "average", "take", "atleast_1d", "broadcast_to", "repeat", "tile"]),
+        ("same plain", ["isclose", "allclose", "array_equal", "searchsorted"]),
+        ("square", ["var", "nanvar"]),
+        ("product", ["dot", "inner", "outer", "cross", "vdot"]),
+        ("plain", ["argmin", "argmax", "nanargmin", "nanargmax", "argsort", "nonzero", "argwhere", \
+                   "count_nonzero", "shape", "size", "ndim"])):
+    for _name in _functions:
+        if hasattr(np, _name):
+            _FUNCTION_RULES[getattr(np, _name)] = _rule
+_FUNCTION_RULES[np.linalg.norm] = "same"
+
+#arguments that are values for the "same" rules, as (positions, keywords), the others are parameters
+#such as axis, shape or decimals. "sequence" means the items of the first argument. The default is
+#the first argument. Plain numbers among the values are unitless.
+_FIRST = ((0, ), ("a", "x", "m", "ar", "arr", "array"))
+_VALUES = {np.clip: ((0, 1, 2), ("a", "a_min", "a_max", "min", "max")), \
+           np.where: ((1, 2), ("x", "y")), \
+           np.full_like: ((0, 1), ("a", "fill_value")), \
+           np.isclose: ((0, 1, 3), ("a", "b", "atol")), \
+           np.allclose: ((0, 1, 3), ("a", "b", "atol")), \
+           np.array_equal: ((0, 1), ("a1", "a2")), \
+           np.searchsorted: ((0, 1), ("a", "v")), \
+           np.concatenate: ("sequence", ("arrays", )), \
+           np.stack: ("sequence", ("arrays", )), \
+           np.hstack: ("sequence", ("tup", )), \
+           np.vstack: ("sequence", ("tup", ))}
+
+
+def _value_dims(func, args, kwargs):
+    positions, keywords = _VALUES.get(func, _FIRST)
+    if positions == "sequence":
+        values = list(args[0]) if args else list(kwargs.get(keywords[0], ()))
+    else:
+        values = [args[i] for i in positions if i < len(args)] + [kwargs[key] for key in keywords if key in kwargs]
+    return [value._dim if isinstance(value, SiUnitQuantity) else DIMENSIONLESS for value in values if value is not None]
+
+
+#replaces quantities by their magnitudes inside (nested) arguments, collecting their dimensions
+def _unwrap(value, dims):
+    if isinstance(value, SiUnitQuantity):
+        dims.append(value._dim)
+        return value.magnitude
+    if isinstance(value, (list, tuple)):
+        return type(value)(_unwrap(item, dims) for item in value)
+    return value
+
+
+def array_function(func, types, args, kwargs):
+    rule = _FUNCTION_RULES.get(func)
+    if rule is None:
+        return NotImplemented
+
+    if rule == "same" or rule == "same plain":
+        value_dims = _value_dims(func, args, kwargs)
+    dims = []
+    args = _unwrap(args, dims)
+    kwargs = {key: _unwrap(value, dims) for key, value in kwargs.items()}
+
+    if rule == "same" or rule == "same plain":
+        dimension = value_dims[0] if value_dims else DIMENSIONLESS
+        for dim in value_dims:
+            if dim is not dimension:
+                raise TypeError("Unit mismatch in np." + func.__name__)
+        if rule == "same plain":
+            dimension = None
+    elif rule == "square":
+        dimension = dimension_power(dims[0], 2)
+    elif rule == "product":
+        dimension = DIMENSIONLESS
+        for dim in dims:
+            dimension = dimension_product(dimension, dim)
+    else:
+        dimension = None
+
+    return _wrap(func(*args, **kwargs), dimension)
+
+
+if __name__ == '__main__':
+
+    x = QuantityArray([1.0, 2.5, 4.0], exponents = {"length": 1})
+    print(x / SiUnitQuantity(2, exponents = {"time": 1}))
@@ -0,0 +1,189 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+
+import numpy as np
+
+import si
+from si_class import SiUnitQuantity
+from natural_class import NaturalUnitQuantity
+
+#Benchmarks of the hot paths. Every case is timed with timeit as the best of several repeats,
+#results are written to JSON so runs can be compared:
+#    python benchmark.py --output before.json
+#    python benchmark.py --compare before.json --threshold 1.25
+#The comparison exits with status 1 if a case got slower than threshold times its old time.
+#The time of "import si" in a fresh interpreter is measured too, and checked against --import-target.
+
+#output formats the cases are timed in, the others use the default format
+_CASE_FORMATS = {"str_custom": ["g", "J", "ms", "A", "K", "mol"]}
+
+
+def _arithmetic_cases():
+    a = SiUnitQuantity(magnitude = 2.5, exponents = {"length": 1, "time": -1})
+    b = SiUnitQuantity(magnitude = 1.5, exponents = {"length": 1, "time": -1})
+    t = SiUnitQuantity(magnitude = 4.0, exponents = {"time": 1})
+    return {
+        "add": lambda: a + b,
+        "mul": lambda: a * t,
+        "div": lambda: a / t,
+        "pow": lambda: a ** 2,
+        "scalar_mul": lambda: 3.0 * a,
+        "compare": lambda: a < b,
+        "equal": lambda: a == b,
+    }
+
+
+def _str_cases():
+    energy = 2.5e-3 * si.Units.J
+    speed = 7 * si.Units.m / si.Units.s
+
+    def render():
+        return str(energy), str(speed)
+
+    return {
+        "str_default": render,
+        "str_custom": render,
+    }
+
+
+#the new_* cases repeat the same strings, so after the first call they measure si.new with a warm
+#unit cache. The parser itself is timed by the compile_unit_* cases, which bypass the cache, and by
+#new_uncached, which clears the cache before every call.
+def _parse_cases():
+    def new_uncached():
+        si.UNIT_CACHE.clear()
+        return si.new("3 kg*m^2/(s^2*(A*s))")
+
+    return {
+        "new_simple": lambda: si.new("9.81 m/s"),
+        "new_nested": lambda: si.new("3 kg*m^2/(s^2*(A*s))"),
+        "new_prefixed": lambda: si.new("-2.5e3 mm"),
+        "new_uncached": new_uncached,
+        "compile_unit_simple": lambda: si.compile_unit("m/s"),
+        "compile_unit_nested": lambda: si.compile_unit("kg*m^2/(s^2*(A*s))"),
+        "compile_unit_long": lambda: si.compile_unit("*".join(["kN"] * 20) + "/" + "/".join(["mm"] * 20)),
+    }
+
+
+def _format_cases():
+    def switch():
+        si.set_format(["kg", "J", "s", "A", "K", "mol"])
+        si.replace({"J": "kJ"})
+        si.set_default_format()
+
+    return {"set_format_replace": switch}
+
+
+def _unit_cases():
+    return {
+        "get_unit": lambda: si.get_unit("N"),
+        "get_unit_prefixed": lambda: si.get_unit("kPa"),
+    }
+
+
+def _natural_cases():
+    a = NaturalUnitQuantity(magnitude = 2.0, exp = 1)
+    b = NaturalUnitQuantity(magnitude = 3.0, exp = 1)
+    return {
+        "natural_add": lambda: a + b,
+        "natural_mul": lambda: a * b,
+        "natural_str": lambda: str(a),
+    }
+
+
+def cases():
+    result = {}
+    for group in (_arithmetic_cases, _str_cases, _parse_cases, _format_cases, _unit_cases, _natural_cases):
+        result.update(group())
+    return result
+
+
+#times every case (or the ones named in only) and returns {name: seconds per call}
+def run(number = 10000, repeat = 5, only = None):
+    results = {}
+    for name, case in cases().items():
+        if only and name not in only:
+            continue
+        if name in _CASE_FORMATS:
+            with si.format_context(_CASE_FORMATS[name]):
+                times = timeit.repeat(case, number = number, repeat = repeat)
+        else:
+            times = timeit.repeat(case, number = number, repeat = repeat)
+        results[name] = min(times) / number
+    return results
+
+
+_IMPORT_SCRIPT = "import sys, time; start = time.perf_counter(); import si; " \
+                 "print(time.perf_counter() - start, 'numpy' in sys.modules)"
+
+
+#returns (best seconds of "import si" in a new interpreter, whether the import loaded NumPy)
+def measure_import(repeat = 5):
+    directory = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for i in range(repeat):
+        output = subprocess.run([sys.executable, "-c", _IMPORT_SCRIPT], cwd = directory, \
+                                capture_output = True, text = True, check = True).stdout.split()
+        seconds = float(output[0])
+        best = seconds if best is None else min(best, seconds)
+    return best, output[1] == "True"
+
+
+#returns [(name, old, new)] for the cases that got slower than threshold times their old time
+def compare(baseline, results, threshold = 1.25):
+    slower = []
+    for name, new in results.items():
+        old = baseline.get(name)
+        if old is not None and new > old * threshold:
+            slower.append((name, old, new))
+    return slower
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Benchmarks of SiUnitQuantity hot paths.")
+    parser.add_argument("--output", help = "write the results to this JSON file")
+    parser.add_argument("--compare", help = "JSON file of an earlier run to check for regressions")
+    parser.add_argument("--threshold", type = float, default = 1.25, help = "allowed slowdown factor")
+    parser.add_argument("--number", type = int, default = 10000, help = "calls per repeat")
+    parser.add_argument("--repeat", type = int, default = 5, help = "repeats, the best one is kept")
+    parser.add_argument("--import-target", type = float, default = 0.05, help = "allowed seconds for import si")
+    parser.add_argument("cases", nargs = "*", help = "run only these cases")
+    args = parser.parse_args(argv)
+
+    results = run(args.number, args.repeat, args.cases)
+    for name, seconds in results.items():
+        print("%-22s %10.3f us" % (name, seconds * 1e6))
+
+    status = 0
+    if not args.cases or "import_si" in args.cases:
+        results["import_si"], numpy_loaded = measure_import(args.repeat)
+        print("%-22s %10.3f ms  (target %.1f ms%s)" % ("import_si", results["import_si"] * 1e3, args.import_target * 1e3, \
+                                                       ", loads NumPy" if numpy_loaded else ""))
+        if results["import_si"] > args.import_target:
+            print("IMPORT TARGET MISSED: %.3f ms > %.3f ms" % (results["import_si"] * 1e3, args.import_target * 1e3))
+            status = 1
+
+    if args.output:
+        report = {"python": platform.python_version(), "numpy": np.__version__, \
+                  "number": args.number, "repeat": args.repeat, "import_target": args.import_target, "results": results}
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent = 2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+        slower = compare(baseline, results, args.threshold)
+        for name, old, new in slower:
+            print("REGRESSION %s: %.3f us -> %.3f us" % (name, old * 1e6, new * 1e6))
+        if slower:
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
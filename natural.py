@@ -0,0 +1,65 @@
+import numpy as np
+
+import si
+from si_class import SiUnitQuantity, intern_dimension
+from array_class import QuantityArray
+from natural_class import NaturalUnitQuantity
+
+#Conversion between SI quantities and natural units with hbar = c = kb = 1, where every quantity
+#is a power of energy measured in eV: mass = E/c^2, length = hbar*c/E, time = hbar/E, temperature = E/kb.
+#The factor of a dimension is computed from si.Constants once and cached, whole arrays are then
+#converted by one multiplication.
+
+_FACTORS = {}
+
+
+#returns (energy exponent, factor) of a dimension, SI value = natural value in eV^exponent * factor
+def natural_factor(dimension):
+    entry = _FACTORS.get(dimension)
+    if entry is not None:
+        return entry
+
+    mass, length, time, current, temperature, amount = dimension
+    if current != 0 or amount != 0:
+        raise ValueError("Only mass, length, time and temperature can be expressed in natural units.")
+
+    exponent = mass - length - time + temperature
+    factor = si.Constants.e.magnitude ** exponent \
+             * si.Constants.c.magnitude ** (length - 2 * mass) \
+             * si.Constants.hbar.magnitude ** (length + time) \
+             * si.Constants.kb.magnitude ** (-temperature)
+    if isinstance(exponent, float) and exponent.is_integer():
+        exponent = int(exponent)
+
+    entry = _FACTORS[dimension] = (exponent, factor)
+    return entry
+
+
+#converts a SiUnitQuantity or QuantityArray to a NaturalUnitQuantity in powers of eV,
+#the magnitude of an array stays an array
+def to_natural(quantity):
+    if not isinstance(quantity, SiUnitQuantity):
+        raise TypeError("Wrong argument type. Function requires a SiUnitQuantity instance.")
+    exponent, factor = natural_factor(quantity.dimension)
+    return NaturalUnitQuantity(magnitude = quantity.magnitude / factor, exp = exponent)
+
+
+#converts a NaturalUnitQuantity, or plain numbers in eV^exponent, to SI in the units of target.
+#target is a unit string like "m/s", a SiUnitQuantity or a dimension. Arrays give a QuantityArray.
+def to_si(value, target):
+    if isinstance(target, str):
+        dimension = si.UNIT_CACHE.lookup(target.strip())[1]
+    elif isinstance(target, SiUnitQuantity):
+        dimension = target.dimension
+    else:
+        dimension = intern_dimension(target)
+    exponent, factor = natural_factor(dimension)
+
+    if isinstance(value, NaturalUnitQuantity):
+        if value.exp != exponent:
+            raise TypeError("Unit mismatch in converting NaturalUnitQuantity to SI units")
+        value = value.magnitude
+
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return QuantityArray.from_dimension(np.asarray(value, dtype = np.float64) * factor, dimension)
+    return SiUnitQuantity.from_dimension(value * factor, dimension)
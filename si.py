@@ -1,9 +1,26 @@
+import builtins
+import contextlib
+import functools
+import os
+import re
 import warnings
+from collections import OrderedDict
 from math import pi
-from si_class import SiUnitQuantity
 
-import numpy as np
-from numpy import linalg
+from si_class import SiUnitQuantity, OutputFormat, DIMENSIONLESS, compiled_format, active_format, REGISTRY, BASIC_PREFIX, \
+                     _CONTEXT_FORMAT, _AUTO_PREFIX, intern_dimension, round_prefixed
+import unit_parser
+#single pass reductions, si.sum etc., see si_reduce
+from si_reduce import sum, mean, std, min, max, dot, Accumulator
+
+#names of "from si import *". sum, mean, std, min, max, dot and compile are left out, so they do not
+#replace the builtins, use them as si.sum etc. QuantityArray, UncertainArray and QuantityTable are
+#left out, so the import does not load NumPy.
+__all__ = ["pi", "SiUnitQuantity", "OutputFormat", "DIMENSIONLESS", "REGISTRY", "BASIC_PREFIX", "SI_BASIC_UNITS", \
+           "Units", "Constants", "set_format", "set_default_format", "get_format", "format_context", "auto_prefix", \
+           "compiled_format", "active_format", "format_many", "replace", "set_unit", "delete_unit", "get_unit", \
+           "UnitCache", "UNIT_CACHE", "unit_cache_info", "new", "ParsedColumn", "new_many", "group_by_dimension", \
+           "resolve_unit", "compile_unit", "UNIT_CHECKS", "units", "parallel_map", "Accumulator"]
 
 SI_BASIC_UNITS = {"mass": "kg", "length": "m", "time": "s", "current": "A", "temperature": "K", "amount of substance": "mol"}
 
@@ -15,44 +32,34 @@ class Units:
                           "charge": "C", "voltage": "V", "capacitance": "F", "resistance": "Ohm", \
                           "Magnetic field": "T", "inductance": "H", }
     
-    #Basic
-    kg = SiUnitQuantity(magnitude = 1, exponents = {"mass": 1})
-    m = SiUnitQuantity(magnitude = 1, exponents = {"length": 1})
-    s = SiUnitQuantity(magnitude = 1, exponents = {"time": 1})
-    A = SiUnitQuantity(magnitude = 1, exponents = {"current": 1})
-    K = SiUnitQuantity(magnitude = 1, exponents = {"temperature": 1})
-    mol = SiUnitQuantity(magnitude = 1, exponents = {"amount of substance": 1})
+    #Basic, taken from the unit registry instead of being computed on import
+    kg = REGISTRY.quantity("kg")
+    m = REGISTRY.quantity("m")
+    s = REGISTRY.quantity("s")
+    A = REGISTRY.quantity("A")
+    K = REGISTRY.quantity("K")
+    mol = REGISTRY.quantity("mol")
     
     #Dependent
-    Hz = 1/s
-    N = kg * m / (s**2)
-    J = N * m
-    W = J / s
-    Pa = N / (m**2)
-    C = A * s
-    V = J / C
-    F = C / V
-    Ohm = V / A
-    T = V * s / (m**2)
-    H = Ohm * s
-    
-    #For internal code
-    _SI_BASIC_UNITS = {"kg": kg, "m": m, "s": s, "A": A, "K": K, "mol": mol}
-    
-    _SI_DEPENDENT_UNITS = {"Hz": Hz, "N": N, "J": J, "W": W, "Pa": Pa, \
-                          "C": C, "V": V, "F": F, "Ohm": Ohm, \
-                          "T": T, "H": H, "g": 1e-3 * kg}
-    
-    BASIC_PREFIX = {"Y" : 1e24, "Z": 1e21, "E": 1e18, "P": 1e15, "T": 1e12, "G": 1e9, \
-                    "M": 1e6, "k": 1e3, "c": 1e-2, "m": 1e-3, "u": 1e-6, "n": 1e-9, \
-                    "p": 1e-12, "f": 1e-15, "a": 1e-18, "z": 1e-21, "y":1e-24}
-    
-    USER_UNITS = {"1": SiUnitQuantity(1), }
-    
-    ALL_UNITS = _SI_BASIC_UNITS.copy() 
-    ALL_UNITS.update(_SI_DEPENDENT_UNITS)
-    ALL_UNITS.update(USER_UNITS)
-    
+    Hz = REGISTRY.quantity("Hz")
+    N = REGISTRY.quantity("N")
+    J = REGISTRY.quantity("J")
+    W = REGISTRY.quantity("W")
+    Pa = REGISTRY.quantity("Pa")
+    C = REGISTRY.quantity("C")
+    V = REGISTRY.quantity("V")
+    F = REGISTRY.quantity("F")
+    Ohm = REGISTRY.quantity("Ohm")
+    T = REGISTRY.quantity("T")
+    H = REGISTRY.quantity("H")
+    
+    BASIC_PREFIX = BASIC_PREFIX
+
+
+def _constant(value, dimension):
+    return SiUnitQuantity.from_dimension(value, intern_dimension(dimension))
+
+
 class Constants:
     
     kg = Units.kg
@@ -69,80 +76,147 @@ class Constants:
     C = Units.C
     
     
-    c = 299792458 * m / s                              #speed of ligtht
-    h = 6.62607015e-34 * J * s                         #Planck constant
-    hbar = h/(2 * pi)                                  #Planck constant
-    G = 6.67430e-11 * J * m / (kg**2)                  #gravity constant
-    eps0 = 8.8541878128e-12 * F / m                    #vacuum electric permittivity
-    mu0 = 1.25663706212e-6 * N / (A**2)                #vacuum magnetic permeability
-    e = 1.602176634e-19 * C                            #elementary charge
-    Na = 6.02214076e23 / mol                           #Avogadro constant
-    kb = 1.380649e-23 * J / K                          #Boltzman constant    
-    alph = 7.2973525693e-3                             #fine structure constant
-    me = 9.1093837015e-31 * kg                         #electron mass
-    mp = 1.67262192369e-27 * kg                        #proton mass
-    mn = 1.67492749804e-27 * kg                        #neutron mass
-    sigm = 5.670374419e-8 * W / ( (m**2) * (K**4) )    #Stefan-Boltzman constant    
+    #values with their dimension vectors (kg, m, s, A, K, mol) in basic SI units
+    c = _constant(299792458.0, (0, 1, -1, 0, 0, 0))                      #speed of ligtht
+    h = _constant(6.62607015e-34, (1, 2, -1, 0, 0, 0))                   #Planck constant
+    hbar = _constant(6.62607015e-34 / (2 * pi), (1, 2, -1, 0, 0, 0))     #Planck constant
+    G = _constant(6.67430e-11, (-1, 3, -2, 0, 0, 0))                     #gravity constant
+    eps0 = _constant(8.8541878128e-12, (-1, -3, 4, 2, 0, 0))             #vacuum electric permittivity
+    mu0 = _constant(1.25663706212e-6, (1, 1, -2, -2, 0, 0))              #vacuum magnetic permeability
+    e = _constant(1.602176634e-19, (0, 0, 1, 1, 0, 0))                   #elementary charge
+    Na = _constant(6.02214076e23, (0, 0, 0, 0, 0, -1))                   #Avogadro constant
+    kb = _constant(1.380649e-23, (1, 2, -2, 0, -1, 0))                   #Boltzman constant    
+    alph = 7.2973525693e-3                                               #fine structure constant
+    me = _constant(9.1093837015e-31, (1, 0, 0, 0, 0, 0))                 #electron mass
+    mp = _constant(1.67262192369e-27, (1, 0, 0, 0, 0, 0))                #proton mass
+    mn = _constant(1.67492749804e-27, (1, 0, 0, 0, 0, 0))                #neutron mass
+    sigm = _constant(5.670374419e-8, (1, 0, -3, 0, -4, 0))               #Stefan-Boltzman constant    
 
 
 ##############################################################################  
     
-#sets the output format for SiUnitQuantity object 
+#sets the output format for SiUnitQuantity object. Inside format_context only the format of
+#that context is changed.
 def set_format(array):
-    
-    if len(array) != 6:
-        raise ValueError("Full basis of output units should be given.")
-        
-    ALL_UNITS = SiUnitQuantity.SI_BASIC_UNITS_DESCRIPT.copy()
-    ALL_UNITS.update(SiUnitQuantity.SI_DEPENDENT_UNITS_DESCRIPT)
-    ALL_UNITS.update(SiUnitQuantity.USER_UNITS_DESCRIPT)
-        
-    transform_matrix = [[0]*6 for i in range(6)]        
-        
-    j = 0
-    for unit in array:
-        i = 0
-            
-        if (unit not in ALL_UNITS) and (unit[1:] not in ALL_UNITS):
-            raise TypeError("Unknown unit.")
-            
-        no_prefix_unit = unit
-        if (unit not in ALL_UNITS) and (unit[0] in SiUnitQuantity.BASIC_PREFIX):
-            no_prefix_unit = unit[1:]
-                
-        for key in SI_BASIC_UNITS:
-            basic_unit = SI_BASIC_UNITS[key]
-            transform_matrix[i][j] = ALL_UNITS[no_prefix_unit][basic_unit]
-            i += 1
-        j += 1
-        
-    transform_matrix = np.array(transform_matrix)
-        
-    if linalg.det(transform_matrix) == 0:
-        raise ValueError("Inrevertible set of units.")
-    
-    SiUnitQuantity.FORMAT = array
+    #the basis is solved here once, __str__ only looks the units up in the compiled format
+    compiled = OutputFormat(array)
+    if _CONTEXT_FORMAT.get() is not None:
+        _CONTEXT_FORMAT.set(compiled)
+        return
+    SiUnitQuantity.FORMAT = list(array)
+    SiUnitQuantity._COMPILED_FORMAT = compiled
 
 
 #sets output format to basic SI units
 def set_default_format():
-    SiUnitQuantity.FORMAT = SiUnitQuantity.BASIC_FORMAT
+    if _CONTEXT_FORMAT.get() is not None:
+        set_format(SiUnitQuantity.BASIC_FORMAT)
+        return
+    SiUnitQuantity.FORMAT = list(SiUnitQuantity.BASIC_FORMAT)
 
 
 #returns currently used format
 def get_format():
-    return SiUnitQuantity.FORMAT.copy()
+    return list(active_format())
+
+
+#renders with the given format inside the with block, only in the current thread or asyncio task:
+#    with si.format_context(["kg", "m", "s", "A", "K", "mol"]):
+#        print(energy)
+#Every context compiles its format once, so threads render in different formats without locking.
+#New threads start with the global format.
+@contextlib.contextmanager
+def format_context(array):
+    token = _CONTEXT_FORMAT.set(OutputFormat(array))
+    try:
+        yield
+    finally:
+        _CONTEXT_FORMAT.reset(token)
+
+
+#str() picks a prefix for one unit of every printed value inside the with block, so that the
+#number is in [1, 1000): 3.2e-9 s is printed as "3.2 ns". The output format is not changed.
+@contextlib.contextmanager
+def auto_prefix(enabled = True):
+    token = _AUTO_PREFIX.set(enabled)
+    try:
+        yield
+    finally:
+        _AUTO_PREFIX.reset(token)
+
+
+#renders many quantities to the same strings as str(). The units of every distinct dimension are
+#rendered once and the magnitudes of a dimension are converted by one vectorized division.
+#With precision the numbers are printed with that many significant digits instead.
+#With auto_prefix every value gets its own best prefix, as in str() inside auto_prefix(),
+#chosen for all values at once by a vectorized lookup.
+def format_many(values, precision = None, auto_prefix = None):
+    from array_class import QuantityArray
+    fmt = compiled_format()
+    if auto_prefix is None:
+        auto_prefix = _AUTO_PREFIX.get()
+    
+    if isinstance(values, QuantityArray):
+        return _format_group(fmt, values.dimension, values.magnitude.ravel(), precision, auto_prefix)
+    
+    values = list(values)
+    result = [None] * len(values)
+    groups = {}
+    for index, value in enumerate(values):
+        if not isinstance(value, SiUnitQuantity):
+            raise TypeError("Wrong argument type. Function requires SiUnitQuantity instances.")
+        if isinstance(value, QuantityArray):
+            result[index] = str(value) if not auto_prefix else fmt.render_prefixed(value.magnitude, value.dimension)
+            continue
+        indices, magnitudes = groups.setdefault(value.dimension, ([], []))
+        indices.append(index)
+        magnitudes.append(value.magnitude)
+    
+    for dimension, (indices, magnitudes) in groups.items():
+        for index, string in zip(indices, _format_group(fmt, dimension, magnitudes, precision, auto_prefix)):
+            result[index] = string
+    return result
+
+
+def _format_group(fmt, dimension, magnitudes, precision, auto_prefix):
+    plan = fmt.prefix_plan(dimension) if auto_prefix else None
+    if plan is None:
+        divisors, suffix = fmt.render(dimension)
+        return [number + suffix for number in _format_numbers(magnitudes, divisors, precision)]
+    
+    import numpy as np
+    magnitudes, indices = fmt.apply_plan(np.asarray(magnitudes, dtype = np.float64), plan, each = True)
+    suffixes = plan[3]
+    return [number + suffixes[index] for number, index in \
+            zip(_format_numbers(magnitudes, (), precision, prefixed = True), indices.tolist())]
+
+
+def _format_numbers(magnitudes, divisors, precision, prefixed = False):
+    import numpy as np
+    if divisors:
+        magnitudes = np.asarray(magnitudes, dtype = np.float64)
+        for divisor in divisors:
+            magnitudes = magnitudes / divisor
+    if isinstance(magnitudes, np.ndarray):
+        magnitudes = magnitudes.tolist()
+    if precision is None:
+        if prefixed:
+            magnitudes = map(round_prefixed, magnitudes)
+        return list(map(str, magnitudes))
+    spec = "." + str(precision) + "g"
+    return [format(magnitude, spec) for magnitude in magnitudes]
 
 
 #changes some of the units in basis
 def replace(units):
     result = []
     
+    current = active_format()
     for key in units:
-        if key not in SiUnitQuantity.FORMAT:
+        if key not in current:
             warnings.warn("Some of the units are not in current format. Not all the units will be changed in current format.")
     
-    for unit in SiUnitQuantity.FORMAT:
+    for unit in current:
         if unit in units:
             result.append(units[unit])
         else:
@@ -160,159 +234,531 @@ def set_unit(name, unit_instance):
     if not isinstance(name, str):
         raise TypeError("Function requires name of the unit in instance of str.")
     
-    ALL_UNITS = SiUnitQuantity.SI_BASIC_UNITS_DESCRIPT.copy()
-    ALL_UNITS.update(SiUnitQuantity.SI_DEPENDENT_UNITS_DESCRIPT)
-
-    if name in ALL_UNITS:
+    if REGISTRY.is_fixed(name):
         raise ValueError("Unchangable unit with this name already exists.")
 
-    if  (name[0] in SiUnitQuantity.BASIC_PREFIX) and (name[1:] in ALL_UNITS):
+    if  (name[0] in BASIC_PREFIX) and REGISTRY.is_fixed(name[1:]):
         raise ValueError("Unit with this name already exists. You may use supported prefixes instead of creating variable with the prefix.")        
     
-    Units.USER_UNITS[name] = unit_instance
-    val = {}
-    val["__val__"] = unit_instance.magnitude
-    
-    for key in SI_BASIC_UNITS:
-        val[SI_BASIC_UNITS[key]] = unit_instance.exponents[key]
-    
-    SiUnitQuantity.USER_UNITS_DESCRIPT[name] = val
+    #the registry version changes, so compiled formats and the unit cache rebuild themselves
+    REGISTRY.define(name, unit_instance.magnitude, unit_instance.dimension)
     
 
 #deletes unit from the library memory
 def delete_unit(name):
 
-    ALL_UNITS = SiUnitQuantity.SI_BASIC_UNITS_DESCRIPT.copy()
-    ALL_UNITS.update(SiUnitQuantity.SI_DEPENDENT_UNITS_DESCRIPT)
-
-    if name in ALL_UNITS:
+    if REGISTRY.is_fixed(name):
         raise ValueError("This unit can not be deleted.")
         
-    if name not in Units.USER_UNITS:
+    if name not in REGISTRY:
         raise ValueError("Unknown unit.")
         
-    del Units.USER_UNITS[name]
-    del SiUnitQuantity.USER_UNITS_DESCRIPT[name]
+    REGISTRY.remove(name)
 
 
 #returns the instance of SI unit by its name
 def get_unit(name):
-    ALL_UNITS = Units._SI_BASIC_UNITS.copy()
-    ALL_UNITS.update(Units._SI_DEPENDENT_UNITS)
-    ALL_UNITS.update(Units.USER_UNITS)
+    return REGISTRY.quantity(name)
     
-    if name in ALL_UNITS:
-        return ALL_UNITS[name]
     
-    if (name[0] in Units.BASIC_PREFIX) and (name[1:] in ALL_UNITS):
-        return Units.BASIC_PREFIX[name[0]] * ALL_UNITS[name[1:]]
-    else:
-        raise ValueError("Unknown unit.")
+##############################################################################
+
+#bounded LRU of compiled unit expressions, cleared whenever the set of units changes
+class UnitCache:
+    
+    def __init__(self, maxsize = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.version = REGISTRY.version
+        self._entries = OrderedDict()
+    
+    #returns (scale, dimension) of the unit expression, compiling it on a miss
+    def lookup(self, expression):
+        if self.version != REGISTRY.version:
+            self.clear()
+        entry = self._entries.get(expression)
+        if entry is not None:
+            self.hits += 1
+            try:
+                self._entries.move_to_end(expression)
+            except KeyError:
+                pass
+            return entry
+        
+        self.misses += 1
+        entry = compile_unit(expression)
+        self._entries[expression] = entry
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last = False)
+        return entry
     
+    def clear(self):
+        self._entries.clear()
+        self.version = REGISTRY.version
     
-##############################################################################
+    def info(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+    
+    
+UNIT_CACHE = UnitCache()
+
+#leading number of a quantity string, the rest of the string is the unit expression
+_NUMBER = re.compile(r"\s*([+-]?(?:(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?|inf(?:inity)?|nan))\s*", re.IGNORECASE)
+
+
+#returns hits/misses/size statistics of the unit expression cache
+def unit_cache_info():
+    return UNIT_CACHE.info()
+
 
 #takes a string of the form "1.0 kg/s" and retururns an instance of SiUnitQuantity that corresponds to the string.
 def new(unit):
-    
-    def parser(string):
-        #processes the string to meaningfull elements list
-        result = ["",]
-        L = len(string)
-        if L == 0:
+    match = _NUMBER.match(unit)
+    if match is None:
+        if unit.strip() == "":
             raise ValueError("Can not convert empty string")
+        raise ValueError("String can not be converted to SI object: wrong format.")
+    
+    scale, dimension = UNIT_CACHE.lookup(unit[match.end():].strip())
+    return SiUnitQuantity.from_dimension(float(match.group(1)) * scale, dimension)
+
+
+#result of new_many
+#values: QuantityArray with a value for every row (NaN for failed rows) if all parsed rows have the same units, otherwise None
+#groups: {dimension: (rows, QuantityArray)} with the parsed rows for each distinct dimension
+#errors: list of (row, message) for the rows that could not be converted
+class ParsedColumn:
+    
+    def __init__(self, values, groups, errors):
+        self.values = values
+        self.groups = groups
+        self.errors = errors
+    
+    def is_homogeneous(self):
+        return self.values is not None
+
+
+#converts many strings like "12.5 kPa" at once. The strings are split and grouped by their unit suffix
+#with vectorized NumPy string operations, every suffix is compiled once and the numbers of a group are
+#converted by one vectorized parse. Rows that fail are reported in errors, or raise the first error if strict is True.
+def new_many(strings, strict = False):
+    import numpy as np
+    from array_class import QuantityArray
+    if not isinstance(strings, np.ndarray):
+        strings = list(strings)
+        #np.asarray would turn numbers among strings into strings, they are kept as objects to fail below
+        if not all(isinstance(string, str) for string in strings):
+            values = np.empty(len(strings), dtype = object)
+            values[:] = strings
+            strings = values
+    strings = np.asarray(strings).ravel()
+    size = len(strings)
+    errors = []
+    slow_rows = []
+    
+    if strings.dtype.kind != "U":
+        #mixed input: non-strings are errors, the rest goes through the vectorized path
+        valid = np.array([isinstance(string, str) for string in strings], dtype = bool)
+        errors.extend((int(row), "String can not be converted to SI object: wrong format.") for row in np.nonzero(~valid)[0])
+        rows = np.nonzero(valid)[0]
+        strings = np.array([strings[row] for row in rows], dtype = str)
+    else:
+        rows = np.arange(size)
+    
+    by_dimension = {}
+    def add_group(suffix, group_rows, magnitudes):
+        try:
+            scale, dimension = UNIT_CACHE.lookup(suffix)
+        except ValueError as error:
+            errors.extend((int(row), str(error)) for row in group_rows)
+            return
+        if scale != 1:
+            magnitudes = magnitudes * scale
+        by_dimension.setdefault(dimension, []).append((group_rows, magnitudes))
+    
+    if len(rows):
+        parts = np.char.partition(np.char.strip(strings), " ")
+        suffixes, inverse = np.unique(np.char.strip(parts[:, 2]), return_inverse = True)
+        order = np.argsort(inverse, kind = "stable")
+        bounds = np.cumsum(np.bincount(inverse, minlength = len(suffixes)))
+        numbers = parts[:, 0]
         
-        for i in range(L):
-            if string[i] == " ":
-                if len(result) == 1:
-                    result += ["",]
+        start = 0
+        for suffix, stop in zip(suffixes.tolist(), bounds.tolist()):
+            group = order[start:stop]
+            start = stop
+            #float() also takes "1_000", which new() rejects: such numbers go to the slow path and are checked there
+            group_numbers = numbers[group]
+            unusual = np.char.find(group_numbers, "_") >= 0
+            if unusual.any():
+                slow_rows.extend(group[unusual].tolist())
+                group = group[~unusual]
+                group_numbers = group_numbers[~unusual]
+                if len(group) == 0:
+                    continue
+            try:
+                magnitudes = group_numbers.astype(np.float64)
+            except ValueError:
+                #strings like "7kg" or broken numbers are parsed one by one
+                slow_rows.extend(group.tolist())
                 continue
-            if string[i] not in SPECIAL:
-                result[-1] += string[i]
-            if string[i] in SPECIAL:
-                if result[-1] == "":
-                    result = result[:-1]
-                result += [string[i], ""]
-                
-        if result[-1] == "":
-            result = result[:-1]
-            
-        first = result[0]
+            add_group(suffix, rows[group], magnitudes)
+    
+    slow_suffixes = {}
+    for index in slow_rows:
+        string = str(strings[index])
+        match = _NUMBER.match(string)
+        if match is None:
+            errors.append((int(rows[index]), "String can not be converted to SI object: wrong format."))
+            continue
+        group_rows, numbers = slow_suffixes.setdefault(string[match.end():].strip(), ([], []))
+        group_rows.append(rows[index])
+        numbers.append(float(match.group(1)))
+    for suffix, (group_rows, numbers) in slow_suffixes.items():
+        add_group(suffix, np.array(group_rows, dtype = np.intp), np.array(numbers, dtype = np.float64))
+    
+    errors.sort()
+    if strict and errors:
+        raise ValueError("Row " + str(errors[0][0]) + ": " + errors[0][1])
+    
+    groups = {}
+    for dimension, group_parts in by_dimension.items():
+        group_rows = np.concatenate([part[0] for part in group_parts])
+        magnitudes = np.concatenate([part[1] for part in group_parts])
+        group_order = np.argsort(group_rows, kind = "stable")
+        groups[dimension] = (group_rows[group_order], QuantityArray.from_dimension(magnitudes[group_order], dimension))
+    
+    values = None
+    if len(groups) <= 1:
+        dimension = next(iter(groups), DIMENSIONLESS)
+        magnitudes = np.full(size, np.nan)
+        if groups:
+            group_rows, array = groups[dimension]
+            magnitudes[group_rows] = array.magnitude
+        values = QuantityArray.from_dimension(magnitudes, dimension)
+    
+    return ParsedColumn(values, groups, errors)
+
+
+#buckets quantities of mixed units in one pass: returns {dimension: QuantityArray} with the values
+#of every dimension in their order in the iterable. QuantityArray items contribute all their elements.
+def group_by_dimension(iterable):
+    import numpy as np
+    from array_class import QuantityArray
+    groups = {}
+    for value in iterable:
+        if not isinstance(value, SiUnitQuantity):
+            raise TypeError("Wrong argument type. Function requires SiUnitQuantity instances.")
+        magnitudes = groups.get(value._dim)
+        if magnitudes is None:
+            magnitudes = groups[value._dim] = []
+        if isinstance(value, QuantityArray):
+            magnitudes.extend(value.magnitude.ravel().tolist())
+        else:
+            magnitudes.append(value.magnitude)
+    return {dimension: QuantityArray.from_dimension(np.array(magnitudes, dtype = np.float64), dimension) \
+            for dimension, magnitudes in groups.items()}
+
+
+#returns (scale, dimension) of a single unit name, possibly with a prefix
+def resolve_unit(name):
+    entry = REGISTRY.lookup(name)
+    if entry is None:
+        raise ValueError("String can not be converted to SI object: wrong format.")
+    return entry
+
+
+#compiles a unit expression like "m/(s*s)" or "kg*m^2/s^2" to its (scale, dimension) in basic SI units
+def compile_unit(expression):
+    if expression == "":
+        return 1, DIMENSIONLESS
+    if expression[0] in "*/":
+        expression = "1" + expression
+    return unit_parser.evaluate(unit_parser.parse(expression), resolve_unit)
+ 
+##############################################################################
+
+#names available inside formulas given as strings to compile()
+_FORMULA_FUNCTIONS = ("sqrt", "cbrt", "exp", "log", "log2", "log10", \
+                      "sin", "cos", "tan", "arcsin", "arccos", "arctan", "arctan2", "sinh", "cosh", "tanh", \
+                      "hypot", "abs", "minimum", "maximum", "where")
+_FORMULA_CONSTANTS = ("c", "h", "hbar", "G", "eps0", "mu0", "e", "Na", "kb", "alph", "me", "mp", "mn", "sigm")
+
+
+#compiles a formula of quantities into a function of plain numbers or NumPy arrays, e.g.
+#    energy = compile("m * v**2 / 2", m = "g", v = "km/s")
+#    energy(3.0, 2.0)   # -> 6000.0, in basic SI units given by energy.unit
+#The formula is a Python expression string (using the NumPy functions above and the physical
+#constants of Constants by name) or a callable taking the inputs as keyword arguments.
+#Units are checked once here, by running the formula on probe quantities. The returned function
+#only scales its arguments from the declared units to basic SI and runs the formula on raw values.
+def compile(formula, **input_units):
+    import numpy as np
+    functions = {name: getattr(np, name) for name in _FORMULA_FUNCTIONS}
+    functions["pi"] = pi
+    
+    names = list(input_units)
+    scales = {}
+    quantities = {}
+    probes = []
+    for index, name in enumerate(names):
+        unit = input_units[name]
+        if isinstance(unit, SiUnitQuantity):
+            scale, dimension = unit.magnitude, unit.dimension
+        else:
+            scale, dimension = UNIT_CACHE.lookup(unit.strip())
+        scales[name] = scale
+        probes.append(1 + (index + 1) / 7)
+        quantities[name] = SiUnitQuantity.from_dimension(probes[-1] * scale, dimension)
+    
+    arguments = ", ".join(names)
+    source = "def formula(" + arguments + "):\n"
+    if isinstance(formula, str):
+        for name in names:
+            if scales[name] != 1:
+                source += "    " + name + " = " + name + " * " + repr(float(scales[name])) + "\n"
+        source += "    return (" + formula + ")\n"
+        constants = {name: getattr(Constants, name) for name in _FORMULA_CONSTANTS}
+        #inputs shadow the constants and functions of the same names
+        checked = eval(formula, {"__builtins__": {}}, {**functions, **constants, **quantities})
+        namespace = {**functions, **{name: constant.magnitude if isinstance(constant, SiUnitQuantity) else constant \
+                                     for name, constant in constants.items()}}
+    else:
+        scaled = [name + " = " + name + (" * " + repr(float(scales[name])) if scales[name] != 1 else "") for name in names]
+        source += "    return function(" + ", ".join(scaled) + ")\n"
+        checked = formula(**quantities)
+        namespace = {"function": formula}
+    exec(source, namespace)
+    function = namespace["formula"]
+    
+    raw = function(*probes)
+    if isinstance(raw, SiUnitQuantity):
+        raise TypeError("The formula should only use plain numbers and NumPy functions, not SiUnitQuantity objects.")
+    if isinstance(checked, SiUnitQuantity):
+        dimension, expected = checked.dimension, checked.magnitude
+    else:
+        dimension, expected = DIMENSIONLESS, checked
+    if not np.allclose(raw, expected, rtol = 1e-9, atol = 0, equal_nan = True):
+        raise ValueError("The formula gives different results with and without units.")
+    
+    function.dimension = dimension
+    function.unit = SiUnitQuantity.from_dimension(1, dimension)
+    function.input_units = dict(input_units)
+    return function
+ 
+##############################################################################
+
+#set SI_UNIT_CHECKS=0 in the environment, or UNIT_CHECKS = False before the decorated functions
+#are defined, to make @units return the functions unchanged
+UNIT_CHECKS = os.environ.get("SI_UNIT_CHECKS", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+#declares the units of arguments and of the returned value, e.g.
+#    @units(v = "m/s", t = "s", ret = "m")
+#    def distance(v, t): ...
+#Only dimensions are compared, so "km" accepts any length. Plain numbers count as unitless.
+#The units are resolved once here, and every combination of argument dimensions is validated
+#once, so repeated calls cost a tuple lookup.
+def units(ret = None, **argument_units):
+    
+    def dimension_of(unit):
+        if isinstance(unit, SiUnitQuantity):
+            return unit.dimension
+        return UNIT_CACHE.lookup(unit.strip())[1]
+    
+    expected = {name: dimension_of(unit) for name, unit in argument_units.items()}
+    expected_ret = None if ret is None else dimension_of(ret)
+    
+    def decorator(function):
+        if not UNIT_CHECKS:
+            return function
+        import inspect
+        
+        signature = inspect.signature(function)
+        for name in expected:
+            if name not in signature.parameters:
+                raise TypeError(function.__name__ + "() has no argument " + name + ".")
+        Parameter = inspect.Parameter
+        parameters = signature.parameters
+        positional = [name for name, parameter in parameters.items() \
+                      if parameter.kind in (Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD)]
+        #(name, position or None, keyword or None, default or None, is *args/**kwargs) of every checked argument,
+        #the values are read from args and kwargs directly, only *args and **kwargs need the binding
+        checked = []
+        for name in expected:
+            parameter = parameters[name]
+            variadic = parameter.kind in (Parameter.VAR_POSITIONAL, Parameter.VAR_KEYWORD)
+            position = positional.index(name) if name in positional else None
+            keyword = None if variadic or parameter.kind is Parameter.POSITIONAL_ONLY else name
+            default = None if parameter.default is Parameter.empty else parameter.default
+            checked.append((name, position, keyword, default, variadic))
+        binding = any(variadic for name, position, keyword, default, variadic in checked)
+        dimensions = [expected[name] for name in expected]
+        valid = set()
         
-        if len(result) == 1:
+        def dimension_id(value):
+            return id(value._dim) if isinstance(value, SiUnitQuantity) else id(DIMENSIONLESS)
+        
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            #arguments are taken as Python binds them, defaults included. None is not checked,
+            #so optional arguments can default to None. Every item of *args or **kwargs is checked.
+            if binding:
+                arguments = signature.bind(*args, **kwargs).arguments
+            key = []
+            for name, position, keyword, default, variadic in checked:
+                if variadic:
+                    value = arguments.get(name, ())
+                    items = value.values() if isinstance(value, dict) else value
+                    key.append(tuple(dimension_id(item) for item in items if item is not None))
+                    continue
+                if position is not None and position < len(args):
+                    value = args[position]
+                elif keyword is not None and keyword in kwargs:
+                    value = kwargs[keyword]
+                else:
+                    value = default
+                key.append(None if value is None else dimension_id(value))
+            key = tuple(key)
+            
+            if key not in valid:
+                for (name, position, keyword, default, variadic), dimension_ids, dimension in zip(checked, key, dimensions):
+                    if dimension_ids is None:
+                        continue
+                    if any(item != id(dimension) for item in (dimension_ids if variadic else (dimension_ids, ))):
+                        raise TypeError("Unit mismatch in argument " + name + " of " + function.__name__ + "()")
+                valid.add(key)
+            
+            result = function(*args, **kwargs)
+            if expected_ret is not None:
+                dimension = result._dim if isinstance(result, SiUnitQuantity) else DIMENSIONLESS
+                if dimension is not expected_ret:
+                    raise TypeError("Unit mismatch in the value returned by " + function.__name__ + "()")
             return result
         
+        return wrapper
+    
+    return decorator
+
+##############################################################################
+
+#Parallel work on many quantities. The magnitudes go to the workers as one float64 buffer with a
+#small code per element that indexes the list of distinct dimensions, in shared memory when the
+#system provides it. Workers rebuild the quantities from the buffer, results that are scalar
+#quantities come back packed the same way.
+
+
+def _pack(values):
+    import numpy as np
+    dimensions = {}
+    codes = []
+    magnitudes = []
+    for value in values:
+        if type(value) is not SiUnitQuantity:
+            return None
+        codes.append(dimensions.setdefault(value._dim, len(dimensions)))
+        magnitudes.append(value.magnitude)
+    return np.array(magnitudes, dtype = np.float64), np.array(codes, dtype = np.int32), list(dimensions)
+
+
+def _unpack(magnitudes, codes, dimensions):
+    #the dimensions come out of pickle as new tuples
+    dimensions = [intern_dimension(dimension) for dimension in dimensions]
+    return [SiUnitQuantity.from_dimension(magnitude, dimensions[code]) for magnitude, code in zip(magnitudes.tolist(), codes.tolist())]
+
+
+def _parallel_task(func, source, start, stop, size, dimensions):
+    import numpy as np
+    if isinstance(source, str):
+        from multiprocessing import shared_memory
+        memory = shared_memory.SharedMemory(name = source)
         try:
-            result = [float(first), ] + ["*", ] + result[1:]
-        except:
-            for i in range(len(first)-1, -1, -1):
-                if first[i].isalpha():
-                    before = first[:i]
-                    after = first[i:]
-                    result = [before, "*", after] + result[1:]
-                    break
-        
-        if result[1] in {"(", ")"}:
-            result = [result[0], ] + ["*", ] + result[1:]
-        return result
-    
-    
-    def calculator(L, first = True):
-        #Computes the final value from the list of elements
-        result = SiUnitQuantity(1)
-        if first:
-            result = SiUnitQuantity(L[0])
-            L = L[1:]
-
-        n = 1
-        while n != 0:
-            n = 0
-            m = 0
-            for i in range(len(L)):
-                if isinstance(L[i], str) and L[i] == '(':
-                    if n == 0:
-                        start = i
-                    n += 1
-                if isinstance(L[i], str) and L[i] == ')':
-                    m += 1
-                    if m == n:
-                        finish = i
-                        break
-            if n != 0:
-                parentheses_value = calculator(["*", ] + L[start+1 : finish], first = False)
-                L = L[:start] + [parentheses_value, ] + L[finish+1:]
-                
-        while len(L) != 0:
-            if isinstance(L[-1], SiUnitQuantity):
-                x = L[-1]
-            if isinstance(L[-1], str) and L[-1] == "*":
-                result *= x
-            if isinstance(L[-1], str) and L[-1] == "/":
-                result /= x
-            L = L[:-1]
-        return result
-    
-    
-    SPECIAL = {"(", ")", "*", "/"}
-
-    elems = parser(unit)
-    elems[0] = float(elems[0])
-    
-    if len(elems) == 1:
-        return SiUnitQuantity(elems[0])
-    
-    for i in range(1, len(elems)):
-        if elems[i] in Units.ALL_UNITS:
-            elems[i] = Units.ALL_UNITS[elems[i]]
-        elif (elems[i][0] in Units.BASIC_PREFIX) and (elems[i][1:] in Units.ALL_UNITS):
-            elems[i] = Units.BASIC_PREFIX[elems[i][0]] * Units.ALL_UNITS[elems[i][1:]]
-        elif elems[i] in SPECIAL:
-            pass
-        else:
-            raise ValueError("String can not be converted to SI object: wrong format.")
+            magnitudes = np.ndarray(size, dtype = np.float64, buffer = memory.buf)[start:stop].copy()
+            codes = np.ndarray(size, dtype = np.int32, buffer = memory.buf, offset = size * 8)[start:stop].copy()
+        finally:
+            memory.close()
+    else:
+        magnitudes, codes = source
+    
+    results = [func(quantity) for quantity in _unpack(magnitudes, codes, dimensions)]
+    packed = _pack(results)
+    return results if packed is None else packed
+
+
+#returns [func(quantity) for quantity in quantities] computed by a pool of worker processes.
+#quantities is a QuantityArray or an iterable of scalar SiUnitQuantity objects, func has to be
+#picklable (defined at module level). workers defaults to the number of CPUs, workers = 1
+#runs in this process.
+def parallel_map(func, quantities, workers = None, chunks_per_worker = 4):
+    import numpy as np
+    from array_class import QuantityArray
+    if isinstance(quantities, QuantityArray):
+        magnitudes = quantities.magnitude.ravel()
+        codes = np.zeros(magnitudes.size, dtype = np.int32)
+        dimensions = [quantities.dimension]
+    else:
+        packed = _pack(quantities)
+        if packed is None:
+            raise TypeError("Wrong argument type. Function requires SiUnitQuantity instances.")
+        magnitudes, codes, dimensions = packed
+    
+    size = magnitudes.size
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or size == 0:
+        return [func(quantity) for quantity in _unpack(magnitudes, codes, dimensions)]
+    
+    from concurrent.futures import ProcessPoolExecutor
+    bounds = np.linspace(0, size, builtins.min(size, workers * chunks_per_worker) + 1).astype(int).tolist()
+    
+    memory = None
+    try:
+        from multiprocessing import shared_memory
+        memory = shared_memory.SharedMemory(create = True, size = size * 12)
+        np.ndarray(size, dtype = np.float64, buffer = memory.buf)[:] = magnitudes
+        np.ndarray(size, dtype = np.int32, buffer = memory.buf, offset = size * 8)[:] = codes
+    except (ImportError, OSError):
+        memory = None
+    
+    try:
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            futures = []
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                source = memory.name if memory is not None else (magnitudes[start:stop], codes[start:stop])
+                futures.append(pool.submit(_parallel_task, func, source, start, stop, size, dimensions))
+            results = []
+            for future in futures:
+                result = future.result()
+                results.extend(result if isinstance(result, list) else _unpack(*result))
+        return results
+    finally:
+        if memory is not None:
+            memory.close()
+            memory.unlink()
+
+##############################################################################
+
+#NumPy and the arrays are loaded by the functions that need them, si.QuantityArray, si.UncertainArray
+#and si.QuantityTable load them on first use
+def __getattr__(name):
+    if name == "QuantityArray":
+        from array_class import QuantityArray
+        return QuantityArray
+    if name == "UncertainArray":
+        from uncertain_class import UncertainArray
+        return UncertainArray
+    if name == "QuantityTable":
+        from table_class import QuantityTable
+        return QuantityTable
+    raise AttributeError("module 'si' has no attribute " + repr(name))
+
+##############################################################################
+
+#SI_STATS=1 in the environment turns the instrumentation of si_stats on at import
+if __name__ != '__main__' and os.environ.get("SI_STATS", "0").strip().lower() not in ("0", "false", "no", "off", ""):
+    import si_stats
+    si_stats.enable()
 
-    return calculator(elems)
- 
 ##############################################################################
     
 if __name__ == '__main__':
@@ -1,179 +1,270 @@
-import numpy as np
-from numpy import linalg
+import bisect
+import contextvars
+import math
+import types
 
 SI_BASIC_UNITS = {"mass": "kg", "length": "m", "time": "s", "current": "A", "temperature": "K", "amount of substance": "mol"}
 
+#order of the exponents in a dimension vector
+BASIC_DIMENSIONS = tuple(SI_BASIC_UNITS)
 
-class SiUnitQuantity:
-    FORMAT = ["kg", "m", "s", "A", "K", "mol"]
-    BASIC_FORMAT = ["kg", "m", "s", "A", "K", "mol"]
+#one shared tuple per distinct dimension, so equal dimensions are the same object
+_DIMENSIONS = {}
+_PRODUCTS = {}
+_QUOTIENTS = {}
+_POWERS = {}
+
+
+#returns the interned exponents vector equal to the given sequence
+def intern_dimension(vector):
+    vector = tuple(vector)
+    dimension = _DIMENSIONS.get(vector)
+    if dimension is None:
+        if len(vector) != len(BASIC_DIMENSIONS):
+            raise ValueError("Dimension vector should have an exponent for each basic unit.")
+        dimension = tuple(int(x) if float(x).is_integer() else float(x) for x in vector)
+        dimension = _DIMENSIONS.setdefault(dimension, dimension)
+        _DIMENSIONS[vector] = dimension
+    return dimension
+
+
+#converts {"length": 1, "time": -1} to an interned dimension vector
+def dimension_from_exponents(exponents):
+    for key in exponents:
+        if key not in SI_BASIC_UNITS:
+            raise ValueError("Unknown dimension: " + str(key) + ".")
+    return intern_dimension([exponents.get(key, 0) for key in BASIC_DIMENSIONS])
+
+
+DIMENSIONLESS = intern_dimension((0, ) * len(BASIC_DIMENSIONS))
+
+
+#dimension algebra on interned vectors, memoized by identity of the operands
+def dimension_product(left, right):
+    if right is DIMENSIONLESS:
+        return left
+    if left is DIMENSIONLESS:
+        return right
+    key = (id(left), id(right))
+    result = _PRODUCTS.get(key)
+    if result is None:
+        result = _PRODUCTS[key] = intern_dimension([x + y for x, y in zip(left, right)])
+    return result
+
+
+def dimension_quotient(left, right):
+    if right is DIMENSIONLESS:
+        return left
+    key = (id(left), id(right))
+    result = _QUOTIENTS.get(key)
+    if result is None:
+        result = _QUOTIENTS[key] = intern_dimension([x - y for x, y in zip(left, right)])
+    return result
+
+
+def dimension_power(dimension, power):
+    if dimension is DIMENSIONLESS:
+        return dimension
+    key = (id(dimension), power)
+    result = _POWERS.get(key)
+    if result is None:
+        result = _POWERS[key] = intern_dimension([x * power for x in dimension])
+    return result
+
+
+BASIC_PREFIX = {"Y" : 1e24, "Z": 1e21, "E": 1e18, "P": 1e15, "T": 1e12, "G": 1e9, \
+                "M": 1e6, "k": 1e3, "c": 1e-2, "m": 1e-3, "u": 1e-6, "n": 1e-9, \
+                "p": 1e-12, "f": 1e-15, "a": 1e-18, "z": 1e-21, "y":1e-24}
+
+
+#engineering prefixes (powers of 1000) sorted by their power of ten, "" is no prefix
+_PREFIX_POWERS = sorted([0] + [round(math.log10(factor)) for factor in BASIC_PREFIX.values() \
+                               if round(math.log10(factor)) % 3 == 0])
+_PREFIX_NAMES = ["" if power == 0 else next(name for name, factor in BASIC_PREFIX.items() if round(math.log10(factor)) == power) \
+                 for power in _PREFIX_POWERS]
+_NO_PREFIX = _PREFIX_POWERS.index(0)
+
+
+#index into _PREFIX_POWERS of the prefix that brings value / prefix^exponent into [1, 1000)
+def prefix_index(value, exponent):
+    if value == 0 or not math.isfinite(value):
+        return _NO_PREFIX
+    power = math.log10(abs(value)) / exponent
+    if exponent > 0:
+        index = bisect.bisect_right(_PREFIX_POWERS, power) - 1
+    else:
+        index = bisect.bisect_left(_PREFIX_POWERS, power)
+    return min(max(index, 0), len(_PREFIX_POWERS) - 1)
+
+
+#prefix_index for every element of an array
+def prefix_indices(values, exponent):
+    import numpy as np
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        powers = np.log10(np.abs(values)) / exponent
+    if exponent > 0:
+        indices = np.searchsorted(_PREFIX_POWERS, powers, side = "right") - 1
+    else:
+        indices = np.searchsorted(_PREFIX_POWERS, powers, side = "left")
+    indices = np.clip(indices, 0, len(_PREFIX_POWERS) - 1)
+    indices[~np.isfinite(powers)] = _NO_PREFIX
+    return indices
+
+
+#value in units with a prefix of 10^power, multiplying by exact powers of ten where it is possible.
+#power can be an array with a power for every value.
+def apply_prefix(value, power):
+    if getattr(power, "ndim", 0) != 0:
+        import numpy as np
+        return np.where(power < 0, value * 10.0 ** -power, value / 10.0 ** power)
+    if power < 0:
+        return value * 10.0 ** -power
+    return value / 10.0 ** power
+
+
+#rounds a number scaled to a prefix to 15 significant digits, so the scaling does not show as
+#float noise: 1e-7 kg is "100.0 ug", not "99.99999999999999 ug"
+def round_prefixed(value):
+    if not math.isfinite(value):
+        return value
+    return float("%.15g" % value)
+
+
+class UnitRegistry:
+    #Every known unit as name -> (scale, dimension) in basic SI units, with a prebuilt index of
+    #all prefixed names, so any name resolves with one dict lookup. Exact names win over
+    #prefixed ones: "T" is tesla, not the tera prefix, and "mm" is milli-meter.
+    #version changes with every change of the units, caches built from the registry compare it.
+    
+    def __init__(self, prefixes):
+        self.prefixes = prefixes
+        self.version = 0
+        self._units = {}
+        self._fixed = set()
+        self._index = {}
+    
+    def __contains__(self, name):
+        return name in self._units
+    
+    def names(self):
+        return list(self._units)
     
-    SI_BASIC_UNITS_DESCRIPT = {"kg": {"__val__":1, "kg": 1, "m": 0, "s": 0, "A": 0, "K": 0, "mol": 0},
-                               "m": {"__val__":1, "kg": 0, "m": 1, "s": 0, "A": 0, "K": 0, "mol": 0},
-                               "s": {"__val__":1, "kg": 0, "m": 0, "s": 1, "A": 0, "K": 0, "mol": 0},
-                               "A": {"__val__":1, "kg": 0, "m": 0, "s": 0, "A": 1, "K": 0, "mol": 0},
-                               "K": {"__val__":1, "kg": 0, "m": 0, "s": 0, "A": 0, "K": 1, "mol": 0},
-                               "mol": {"__val__":1, "kg": 0, "m": 0, "s": 0, "A": 0, "K": 0, "mol": 1},}
+    def is_fixed(self, name):
+        return name in self._fixed
     
-    SI_DEPENDENT_UNITS_DESCRIPT = {"Hz": {"__val__":1, "kg": 0, "m": 0, "s": -1, "A": 0, "K": 0, "mol": 0},
-                                   "N": {"__val__":1, "kg": 1, "m": 1, "s": -2, "A": 0, "K": 0, "mol": 0},
-                                   "J": {"__val__":1, "kg": 1, "m": 2, "s": -2, "A": 0, "K": 0, "mol": 0},
-                                   "W": {"__val__":1, "kg": 1, "m": 2, "s": -3, "A": 0, "K": 0, "mol": 0},
-                                   "Pa": {"__val__":1, "kg": 1, "m": -1, "s": -2, "A": 0, "K": 0, "mol": 0},
-                                   "C": {"__val__":1, "kg": 0, "m": 0, "s": 1, "A": 1, "K": 0, "mol": 0},
-                                   "V": {"__val__":1, "kg": 1, "m": 2, "s": -3, "A": -1, "K": 0, "mol": 0},
-                                   "F": {"__val__":1, "kg": -1, "m": -2, "s": 4, "A": 2, "K": 0, "mol": 0},
-                                   "Ohm": {"__val__":1, "kg": 1, "m": 2, "s": -3, "A": -2, "K": 0, "mol": 0},
-                                   "T": {"__val__":1, "kg": 1, "m": 0, "s": -2, "A": -1, "K": 0, "mol": 0},
-                                   "H": {"__val__":1, "kg": 1, "m": 2, "s": -2, "A": -2, "K": 0, "mol": 0},
-                                   "g": {"__val__":1e-3, "kg": 1, "m": 0, "s": 0, "A": 0, "K": 0, "mol": 0},}
+    #returns (scale, dimension) of a unit name, possibly with a prefix, or None for an unknown name
+    def lookup(self, name):
+        return self._index.get(name)
     
-    USER_UNITS_DESCRIPT = {"1": {"__val__":1, "kg": 0, "m": 0, "s": 0, "A": 0, "K": 0, "mol": 0},}    
+    def quantity(self, name):
+        entry = self._index.get(name)
+        if entry is None:
+            raise ValueError("Unknown unit.")
+        return SiUnitQuantity.from_dimension(entry[0], entry[1])
     
+    def define(self, name, scale, dimension, fixed = False):
+        self._units[name] = (scale, intern_dimension(dimension))
+        if fixed:
+            self._fixed.add(name)
+        self._rebuild()
     
-    BASIC_PREFIX = {"Y" : 1e24, "Z": 1e21, "E": 1e18, "P": 1e15, "T": 1e12, "G": 1e9, \
-                    "M": 1e6, "k": 1e3, "c": 1e-2, "m": 1e-3, "u": 1e-6, "n": 1e-9, \
-                    "p": 1e-12, "f": 1e-15, "a": 1e-18, "z": 1e-21, "y":1e-24}
+    def remove(self, name):
+        del self._units[name]
+        self._rebuild()
+    
+    def _rebuild(self):
+        index = {}
+        for name, (scale, dimension) in self._units.items():
+            for prefix, factor in self.prefixes.items():
+                index.setdefault(prefix + name, (factor * scale, dimension))
+        index.update(self._units)
+        self._index = index
+        self.version += 1
+
+
+class SiUnitQuantity:
+    __slots__ = ("magnitude", "_dim")
+
+    FORMAT = ["kg", "m", "s", "A", "K", "mol"]
+    BASIC_FORMAT = ["kg", "m", "s", "A", "K", "mol"]
+    _COMPILED_FORMAT = None
+    
+    BASIC_PREFIX = BASIC_PREFIX
     
     
-    def __init__(self, magnitude = 1.0, exponents = {"mass": 0, "length": 0, "time": 0, "current": 0, "temperature": 0}):
-        self.exponents = exponents
-        for unit in SI_BASIC_UNITS:
-            if unit not in self.exponents:
-                self.exponents[unit] = 0
+    #exponents may be a dict like {"length": 1, "time": -1} or a full dimension vector
+    def __init__(self, magnitude = 1.0, exponents = None):
+        if exponents is None:
+            self._dim = DIMENSIONLESS
+        elif isinstance(exponents, dict):
+            self._dim = dimension_from_exponents(exponents)
+        else:
+            self._dim = intern_dimension(exponents)
         self.magnitude = magnitude
 
+    #builds a quantity from an already interned dimension, skipping the checks of __init__
+    @classmethod
+    def from_dimension(cls, magnitude, dimension):
+        quantity = object.__new__(cls)
+        quantity.magnitude = magnitude
+        quantity._dim = dimension
+        return quantity
+
+    #pickles as (class, magnitude, dimension tuple). pickle stores a shared dimension tuple once,
+    #and it is interned again on loading so the identity checks keep working.
+    def __reduce__(self):
+        return _restore, (type(self), self.magnitude, self._dim)
+
+    @property
+    def dimension(self):
+        return self._dim
+
+    #read-only view, the units are changed by assigning a whole dict to exponents
+    @property
+    def exponents(self):
+        return types.MappingProxyType(dict(zip(BASIC_DIMENSIONS, self._dim)))
+
+    @exponents.setter
+    def exponents(self, exponents):
+        self._dim = dimension_from_exponents(exponents)
+
     def is_unitless(self):
-        return all(val == 0 for val in self.exponents.values())
+        return self._dim is DIMENSIONLESS
 
     def match_units(self, other):
-        return self.exponents == other.exponents
+        return self._dim is other._dim
 
 
     def __str__(self):
-        units_format = SiUnitQuantity.FORMAT
-        result = ''
-        
-        numerator = ''
-        denominator = ''        
-        numerator_num = 0
-        denominator_num = 0
-        
-        #Linear algebra
-        if len(units_format) != 6:
-            raise ValueError("Full basis of output units should be given.")
-        
-        basic = np.array([self.exponents[key] for key in SI_BASIC_UNITS])
-        
-        ALL_UNITS = SiUnitQuantity.SI_BASIC_UNITS_DESCRIPT.copy()
-        ALL_UNITS.update(SiUnitQuantity.SI_DEPENDENT_UNITS_DESCRIPT)
-        ALL_UNITS.update(SiUnitQuantity.USER_UNITS_DESCRIPT)
-        
-        transform_matrix = [[0]*6 for i in range(6)]        
-        
-        j = 0
-        for unit in units_format:
-            i = 0
-            
-            if (unit not in ALL_UNITS) and (unit[1:] not in ALL_UNITS):
-                raise TypeError("Unknown unit.")
-            
-            no_prefix_unit = unit
-            if (unit not in ALL_UNITS) and (unit[0] in SiUnitQuantity.BASIC_PREFIX):
-                no_prefix_unit = unit[1:]
-                
-            for key in SI_BASIC_UNITS:
-                basic_unit = SI_BASIC_UNITS[key]
-                transform_matrix[i][j] = ALL_UNITS[no_prefix_unit][basic_unit]
-                i += 1
-            j += 1
-        
-        transform_matrix = np.array(transform_matrix)
-        
-        if linalg.det(transform_matrix) == 0:
-            raise ValueError("Inrevertible set of units.")
-        
-        coefs = linalg.solve(transform_matrix, basic)
-        coefs = {units_format[i]: coefs[i] for i in range(6)}
-
-        #calculating a right number
+        if _AUTO_PREFIX.get():
+            return compiled_format().render_prefixed(self.magnitude, self._dim)
+        divisors, suffix = compiled_format().render(self._dim)
         num = self.magnitude
-                
-        for unit in coefs:    
-            no_prefix_unit = unit
-            prefix = 1
-            if (unit not in ALL_UNITS) and (unit[0] in SiUnitQuantity.BASIC_PREFIX):
-                no_prefix_unit = unit[1:]
-                prefix = SiUnitQuantity.BASIC_PREFIX[unit[0]]
-            num /= (prefix * ALL_UNITS[no_prefix_unit]["__val__"])**coefs[unit]        
-        
-        result = str(num) + ' '
+        for divisor in divisors:
+            num = num / divisor
+        return str(num) + suffix
 
-        if self.is_unitless():
-            return result[:-1]
-        
-        #Helper functionfor cool output
-        def out_func(unit_exp, name):
-            nonlocal numerator, denominator, numerator_num, denominator_num
-            
-            new_unit_exp = unit_exp
-            if unit_exp.is_integer():
-                new_unit_exp = int(unit_exp)
-            
-            if new_unit_exp > 0:
-                if new_unit_exp == 1:
-                    numerator += name + ' * '
-                else:
-                    numerator += name + '^' + str(new_unit_exp) + ' * '
-                numerator_num += 1
-            elif new_unit_exp < 0:
-                if new_unit_exp == -1:
-                    denominator += name + ' * '
-                else:
-                    denominator += name + '^' + str(-new_unit_exp) + ' * '
-                denominator_num += 1
-
-        #building a units string
-        for unit in coefs:
-            out_func(coefs[unit], unit)
 
-        
-        if numerator_num == 0:
-            numerator = '1'
-        elif numerator_num == 1:
-            numerator = numerator[:-3]
-            if denominator_num == 0:
-                return result + numerator
-            
-        else:
-            numerator = numerator[:-3]
-            if denominator_num != 0:
-                numerator = '(' + numerator + ')'
-            else:
-                return result + numerator
-            
+    #NumPy protocols, see array_class
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        from array_class import array_ufunc
+        return array_ufunc(ufunc, method, *inputs, **kwargs)
 
-        if denominator_num == 1:
-            denominator = denominator[:-3]
-        else:
-            denominator = denominator[:-3]
-            denominator = '(' + denominator + ')'
-            
-        result += numerator + '/' + denominator
-        
-        return result
+    def __array_function__(self, func, types, args, kwargs):
+        from array_class import array_function
+        return array_function(func, types, args, kwargs)
 
 
     #arithmetics
     def __add__(self, right):
         if not isinstance(right, SiUnitQuantity):
             if self.is_unitless():
-                return SiUnitQuantity(magnitude = self.magnitude + right)
+                return _quantity(self.magnitude + right, DIMENSIONLESS)
             else:
                 raise TypeError("Unit mismatch in adding SiUnitQuantity and a non-SiUnitQuantity")
-        if not self.match_units(right):
+        if self._dim is not right._dim:
             raise TypeError("Unit mismatch in adding two SiUnitQuantities")
-        return SiUnitQuantity(magnitude = self.magnitude + right.magnitude, exponents = dict(self.exponents))
+        return _quantity(self.magnitude + right.magnitude, self._dim)
 
     def __radd__(self, right):
         return self + right
@@ -182,47 +273,42 @@ class SiUnitQuantity:
     def __sub__(self, right):
         if not isinstance(right, SiUnitQuantity):
             if self.is_unitless():
-                return SiUnitQuantity(magnitude = self.magnitude - right)
+                return _quantity(self.magnitude - right, DIMENSIONLESS)
             else:
                 raise TypeError("Unit mismatch in substructing SiUnitQuantity and a non-SiUnitQuantity")
-        if not self.match_units(right):
+        if self._dim is not right._dim:
             raise TypeError("Unit mismatch in substructing two SiUnitQuantities")
-        return SiUnitQuantity(magnitude = self.magnitude - right.magnitude, exponents = dict(self.exponents))
+        return _quantity(self.magnitude - right.magnitude, self._dim)
 
     def __rsub__(self, right):
         if not isinstance(right, SiUnitQuantity):
             if self.is_unitless():
-                return SiUnitQuantity(magnitude = right - self.magnitude)
+                return _quantity(right - self.magnitude, DIMENSIONLESS)
             raise TypeError("Unit mismatch in substructing SiUnitQuantity and a non-SiUnitQuantity")
 
     
     def __mul__(self, right):
         if not isinstance(right, SiUnitQuantity):
-            return SiUnitQuantity(self.magnitude * right, exponents = dict(self.exponents))              
-        new_exponents = {key: self.exponents[key] + right.exponents[key] for key in self.exponents.keys()}
-        return SiUnitQuantity(self.magnitude * right.magnitude, exponents = new_exponents)
+            return _quantity(self.magnitude * right, self._dim)
+        return _quantity(self.magnitude * right.magnitude, dimension_product(self._dim, right._dim))
 
     def __rmul__(self, right):
         return self*right
 
     def __truediv__(self, right):
         if not isinstance(right, SiUnitQuantity):
-            return SiUnitQuantity(self.magnitude / right, exponents = dict(self.exponents))
-        new_exponents = {key: self.exponents[key] - right.exponents[key] for key in self.exponents.keys()}
-        return SiUnitQuantity(self.magnitude / right.magnitude, exponents = new_exponents)
+            return _quantity(self.magnitude / right, self._dim)
+        return _quantity(self.magnitude / right.magnitude, dimension_quotient(self._dim, right._dim))
 
     def __rtruediv__(self, right):
         if not isinstance(right, SiUnitQuantity):
-            new_exponents = {key: -self.exponents[key] for key in self.exponents.keys()}
-            return SiUnitQuantity(right/self.magnitude, exponents  = new_exponents)
+            return _quantity(right / self.magnitude, dimension_quotient(DIMENSIONLESS, self._dim))
 
     def __pow__(self, right):
         if not isinstance(right, SiUnitQuantity):
-            new_exponents = {key: self.exponents[key] * right for key in self.exponents.keys()}
-            return SiUnitQuantity(magnitude = self.magnitude ** right, exponents = new_exponents)
+            return _quantity(self.magnitude ** right, dimension_power(self._dim, right))
         elif isinstance(right, SiUnitQuantity) and right.is_unitless():
-            new_exponents = {key: self.exponents[key] * right.magnitude for key in self.exponents.keys()}
-            return SiUnitQuantity(magnitude = self.magnitude ** right.magnitude, exponents = new_exponents) 
+            return _quantity(self.magnitude ** right.magnitude, dimension_power(self._dim, right.magnitude))
         else:
             raise ValueError('Needs unitless number for a power.')
     
@@ -238,12 +324,19 @@ class SiUnitQuantity:
                 return self.magnitude == other
             else:
                 raise TypeError("Unit mismatch in comparing SiUnitQuantity and a non-SiUnitQuantity")
-        if not self.match_units(other):
+        if self._dim is not other._dim:
             raise TypeError("Unit mismatch in comparing two SiUnitQuantities")
         return self.magnitude == other.magnitude
 
     def __ne__(self, other):
         return not self == other
+    
+    #equal quantities have the same units, so the dimension is part of the hash. Unitless
+    #quantities compare equal to plain numbers and hash like them.
+    def __hash__(self):
+        if self._dim is DIMENSIONLESS:
+            return hash(self.magnitude)
+        return hash((self.magnitude, self._dim))
         
     def __lt__(self, right):  #<
         if not isinstance(right, SiUnitQuantity):
@@ -251,7 +344,7 @@ class SiUnitQuantity:
                 return self.magnitude < right
             raise ValueError('Quantities with different units cannot be compared.')
         
-        if self.match_units(right):
+        if self._dim is right._dim:
             return self.magnitude < right.magnitude
         raise ValueError('Quantities with different units cannot be compared')
     
@@ -262,7 +355,7 @@ class SiUnitQuantity:
                 return self.magnitude > right
             raise ValueError('Quantities with different units cannot be compared.')
         
-        if self.match_units(right):
+        if self._dim is right._dim:
             return self.magnitude > right.magnitude
         raise ValueError('Quantities with different units cannot be compared')
         
@@ -272,7 +365,7 @@ class SiUnitQuantity:
                 return self.magnitude <= right
             raise ValueError('Quantities with different units cannot be compared.')
         
-        if self.match_units(right):
+        if self._dim is right._dim:
             return self.magnitude <= right.magnitude
         raise ValueError('Quantities with different units cannot be compared')            
 
@@ -282,12 +375,12 @@ class SiUnitQuantity:
                 return self.magnitude >= right
             raise ValueError('Quantities with different units cannot be compared.')
         
-        if self.match_units(right):
+        if self._dim is right._dim:
             return self.magnitude >= right.magnitude
         raise ValueError('Quantities with different units cannot be compared')
         
     def __abs__(self):
-        return SiUnitQuantity(magnitude = abs(self.magnitude), exponents = self.exponents)
+        return _quantity(abs(self.magnitude), self._dim)
     
     def __int__(self):
         return int(self.magnitude)
@@ -296,12 +389,232 @@ class SiUnitQuantity:
         return float(self.magnitude)
     
     def __round__(self, digits = 0):
-        return SiUnitQuantity(magnitude = round(self.magnitude, digits), exponents = self.exponents)
+        return _quantity(round(self.magnitude, digits), self._dim)
     
     def int_units(self):    
     #Converts float exponents to int expotnents
-        new_exponents = {key : int(self.exponents[key]) for key in self.exponents.keys()}
-        return SiUnitQuantity(magnitude = self.magnitude, exponents = new_exponents)
+        return _quantity(self.magnitude, intern_dimension([int(x) for x in self._dim]))
+
+class OutputFormat:
+    #Output basis compiled once: inverse transform matrix, unit scales and memo of rendered units per dimension
+
+    def __init__(self, units_format):
+        if len(units_format) != 6:
+            raise ValueError("Full basis of output units should be given.")
+
+        transform_matrix = [[0]*6 for i in range(6)]
+        scales = []
+
+        j = 0
+        for unit in units_format:
+            entry = REGISTRY.lookup(unit)
+            if entry is None:
+                raise TypeError("Unknown unit.")
+            for i in range(6):
+                transform_matrix[i][j] = entry[1][i]
+            scales.append(entry[0])
+            j += 1
+
+        self.source = list(units_format)
+        self.version = REGISTRY.version
+        self.units = tuple(units_format)
+        self.scales = tuple(scales)
+        self._memo = {}
+        self._plans = {}
+
+        #the basic units need no solve, so printing in the default format does not load NumPy
+        if transform_matrix == [[int(i == j) for j in range(6)] for i in range(6)]:
+            self.inverse = None
+            return
+
+        import numpy as np
+        transform_matrix = np.array(transform_matrix)
+
+        if np.linalg.det(transform_matrix) == 0:
+            raise ValueError("Inrevertible set of units.")
+
+        self.inverse = np.linalg.inv(transform_matrix)
+
+    #exponents of the output units that express the dimension
+    def coefficients(self, dimension):
+        if self.inverse is None:
+            return list(dimension)
+        coefs = []
+        for coef in self.inverse.dot(dimension):
+            coef = round(float(coef), 9)
+            coefs.append(int(coef) if coef.is_integer() else coef)
+        return coefs
+
+    #returns (divisors, suffix): magnitude / divisors gives the number printed before the suffix
+    def render(self, dimension):
+        entry = self._memo.get(dimension)
+        if entry is None:
+            entry = self._memo[dimension] = self._render(dimension)
+        return entry
+
+    def _render(self, dimension):
+        coefs = self.coefficients(dimension)
+        divisors = tuple(scale ** coef for scale, coef in zip(self.scales, coefs) if scale != 1 and coef != 0)
+        return divisors, self._suffix(self.units, coefs)
+
+    #returns (divisors, exponent, shift, suffixes) for printing the dimension with a prefix on one unit:
+    #magnitude / divisors * 10^shift is the value in the unprefixed unit with the given exponent, and
+    #suffixes[i] are the units with prefix _PREFIX_NAMES[i]. None if no unit of the output can take a prefix.
+    def prefix_plan(self, dimension):
+        if dimension in self._plans:
+            return self._plans[dimension]
+        divisors, suffix = self.render(dimension)
+        coefs = self.coefficients(dimension)
+
+        plan = None
+        #a unit of the numerator gets the prefix, else one of the denominator. Only plain unit
+        #names can take one, kg is printed in g.
+        candidates = [i for i in range(6) if coefs[i] > 0] + [i for i in range(6) if coefs[i] < 0]
+        for i in candidates:
+            unit = self.units[i]
+            if unit not in REGISTRY or unit == "1":
+                continue
+            base, shift = (unit, 0)
+            if unit == "kg":
+                base, shift = ("g", 3 * coefs[i])
+            suffixes = []
+            for prefix in _PREFIX_NAMES:
+                units = list(self.units)
+                units[i] = prefix + base
+                suffixes.append(self._suffix(units, coefs))
+            plan = (divisors, coefs[i], shift, tuple(suffixes))
+            break
+        self._plans[dimension] = plan
+        return plan
+
+    #renders a magnitude, or an array of magnitudes sharing one prefix, with the best prefix
+    def render_prefixed(self, magnitude, dimension):
+        plan = self.prefix_plan(dimension)
+        if plan is None:
+            divisors, suffix = self.render(dimension)
+            for divisor in divisors:
+                magnitude = magnitude / divisor
+            return str(magnitude) + suffix
+
+        magnitude, indices = self.apply_plan(magnitude, plan)
+        if getattr(magnitude, "ndim", 0) == 0:
+            magnitude = round_prefixed(float(magnitude))
+        return str(magnitude) + plan[3][int(indices)]
+
+    #returns (magnitudes in the best prefixed units, indices into _PREFIX_POWERS of the prefixes).
+    #With each, every element gets its own prefix, else an array is printed with the prefix of its
+    #largest finite value. The kg shift and the prefix are applied as one power of ten.
+    def apply_plan(self, magnitude, plan, each = False):
+        divisors, exponent, shift, suffixes = plan
+        for divisor in divisors:
+            magnitude = magnitude / divisor
+        if each:
+            import numpy as np
+            indices = prefix_indices(apply_prefix(magnitude, -shift) if shift else magnitude, exponent)
+            powers = np.array(_PREFIX_POWERS)[indices] * exponent - shift
+            return apply_prefix(magnitude, powers), indices
+        if getattr(magnitude, "ndim", 0) == 0:
+            largest = float(magnitude)
+        else:
+            import numpy as np
+            finite = np.abs(magnitude[np.isfinite(magnitude)])
+            largest = float(finite.max()) if finite.size else 0.0
+        index = prefix_index(apply_prefix(largest, -shift), exponent)
+        power = _PREFIX_POWERS[index] * exponent - shift
+        if power != 0:
+            magnitude = apply_prefix(magnitude, power)
+        return magnitude, index
+
+    @staticmethod
+    def _suffix(units, coefs):
+        numerator = []
+        denominator = []
+        for unit, unit_exp in zip(units, coefs):
+            if unit_exp > 0:
+                numerator.append(unit if unit_exp == 1 else unit + '^' + str(unit_exp))
+            elif unit_exp < 0:
+                denominator.append(unit if unit_exp == -1 else unit + '^' + str(-unit_exp))
+
+        if not numerator and not denominator:
+            return ''
+
+        if not denominator:
+            return ' ' + ' * '.join(numerator)
+
+        if len(numerator) == 0:
+            numerator = '1'
+        elif len(numerator) == 1:
+            numerator = numerator[0]
+        else:
+            numerator = '(' + ' * '.join(numerator) + ')'
+
+        if len(denominator) == 1:
+            denominator = denominator[0]
+        else:
+            denominator = '(' + ' * '.join(denominator) + ')'
+
+        return ' ' + numerator + '/' + denominator
+
+
+#compiled output format of the current thread or task, set by si.format_context. Outside of a
+#format context it is None and the global SiUnitQuantity.FORMAT is used.
+_CONTEXT_FORMAT = contextvars.ContextVar("si_format", default = None)
+
+
+#whether str() picks the prefix of the printed unit by the value, set by si.auto_prefix
+_AUTO_PREFIX = contextvars.ContextVar("si_auto_prefix", default = False)
+
+
+#returns the output format in effect in the current context
+def active_format():
+    fmt = _CONTEXT_FORMAT.get()
+    if fmt is None:
+        return SiUnitQuantity.FORMAT
+    return fmt.source
+
+
+#returns the compiled form of the active format, compiling it again if the format or the units changed
+def compiled_format():
+    fmt = _CONTEXT_FORMAT.get()
+    if fmt is not None:
+        if fmt.version != REGISTRY.version:
+            fmt = OutputFormat(fmt.source)
+            _CONTEXT_FORMAT.set(fmt)
+        return fmt
+    
+    fmt = SiUnitQuantity._COMPILED_FORMAT
+    #compared by value, so a FORMAT list edited in place is compiled again
+    if fmt is None or fmt.source != SiUnitQuantity.FORMAT or fmt.version != REGISTRY.version:
+        fmt = SiUnitQuantity._COMPILED_FORMAT = OutputFormat(SiUnitQuantity.FORMAT)
+    return fmt
+
+
+_quantity = SiUnitQuantity.from_dimension
+
+
+def _restore(cls, magnitude, dimension):
+    return cls.from_dimension(magnitude, intern_dimension(dimension))
+
+
+REGISTRY = UnitRegistry(BASIC_PREFIX)
+
+#basic SI units
+for _name, _dimension in (("kg", (1, 0, 0, 0, 0, 0)), ("m", (0, 1, 0, 0, 0, 0)), ("s", (0, 0, 1, 0, 0, 0)), \
+                          ("A", (0, 0, 0, 1, 0, 0)), ("K", (0, 0, 0, 0, 1, 0)), ("mol", (0, 0, 0, 0, 0, 1))):
+    REGISTRY.define(_name, 1, _dimension, fixed = True)
+
+#dependent SI units
+for _name, _scale, _dimension in (("Hz", 1.0, (0, 0, -1, 0, 0, 0)), ("N", 1.0, (1, 1, -2, 0, 0, 0)), \
+                                  ("J", 1.0, (1, 2, -2, 0, 0, 0)), ("W", 1.0, (1, 2, -3, 0, 0, 0)), \
+                                  ("Pa", 1.0, (1, -1, -2, 0, 0, 0)), ("C", 1, (0, 0, 1, 1, 0, 0)), \
+                                  ("V", 1.0, (1, 2, -3, -1, 0, 0)), ("F", 1.0, (-1, -2, 4, 2, 0, 0)), \
+                                  ("Ohm", 1.0, (1, 2, -3, -2, 0, 0)), ("T", 1.0, (1, 0, -2, -1, 0, 0)), \
+                                  ("H", 1.0, (1, 2, -2, -2, 0, 0)), ("g", 1e-3, (1, 0, 0, 0, 0, 0))):
+    REGISTRY.define(_name, _scale, _dimension, fixed = True)
+
+#user units
+REGISTRY.define("1", 1, DIMENSIONLESS)
+
 
 if __name__ == '__main__':
  
@@ -0,0 +1,294 @@
+import csv
+import json
+import re
+import struct
+
+import numpy as np
+
+import si
+from si_class import SiUnitQuantity, DIMENSIONLESS, compiled_format, intern_dimension
+from array_class import QuantityArray
+
+#Reading and writing unit-annotated text tables in fixed-size chunks, so files of any size
+#are processed with bounded memory. Units are given either in the header, "pressure [kPa]",
+#in which case the cells are plain numbers, or in every cell, "3 kPa".
+
+_HEADER_UNIT = re.compile(r"^(.*?)\s*\[(.*)\]\s*$")
+
+
+#one block of rows of a table
+#start: index of the first row of the chunk, rows are counted from 0 after the header
+#columns: {name: QuantityArray} with one value per row, NaN where the cell could not be read
+#errors: list of (row, name, message) for the cells that could not be read
+class Chunk:
+
+    def __init__(self, start, columns, errors):
+        self.start = start
+        self.columns = columns
+        self.errors = errors
+
+    def __len__(self):
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+
+class _Column:
+    #unit state of a column shared by all chunks of a file
+
+    def __init__(self, name, unit):
+        self.name = name
+        self.scale = 1
+        self.dimension = None
+        if unit is not None:
+            self.scale, self.dimension = si.UNIT_CACHE.lookup(unit.strip())
+        self.units_in_header = unit is not None
+
+    def convert(self, cells, start, errors):
+        if self.units_in_header:
+            return self._convert_numbers(cells, start, errors)
+        return self._convert_quantities(cells, start, errors)
+
+    def _convert_numbers(self, cells, start, errors):
+        try:
+            magnitudes = np.array(cells, dtype = str).astype(np.float64)
+        except ValueError:
+            magnitudes = np.empty(len(cells))
+            for row, cell in enumerate(cells):
+                try:
+                    magnitudes[row] = float(cell)
+                except ValueError:
+                    magnitudes[row] = np.nan
+                    errors.append((start + row, self.name, "Can not convert the cell to a number."))
+        if self.scale != 1:
+            magnitudes *= self.scale
+        return QuantityArray.from_dimension(magnitudes, self.dimension)
+
+    def _convert_quantities(self, cells, start, errors):
+        parsed = si.new_many(cells)
+        for row, message in parsed.errors:
+            errors.append((start + row, self.name, message))
+
+        if self.dimension is None and parsed.groups:
+            #the units of the first readable cell fix the units of the column
+            self.dimension = min(parsed.groups, key = lambda dimension: parsed.groups[dimension][0][0])
+
+        magnitudes = np.full(len(cells), np.nan)
+        for dimension, (rows, values) in parsed.groups.items():
+            if dimension is self.dimension:
+                magnitudes[rows] = values.magnitude
+            else:
+                errors.extend((start + int(row), self.name, "Unit mismatch in the column.") for row in rows)
+        return QuantityArray.from_dimension(magnitudes, DIMENSIONLESS if self.dimension is None else self.dimension)
+
+
+def _open(file, mode):
+    if hasattr(file, "read") or hasattr(file, "write"):
+        return file, False
+    return open(file, mode, newline = ""), True
+
+
+def _split_rows(lines, delimiter):
+    if delimiter is None:
+        for line in lines:
+            yield line.split()
+    else:
+        yield from csv.reader(lines, delimiter = delimiter)
+
+
+#yields Chunk objects of at most chunk_size rows. delimiter is "," by default or None for
+#whitespace separated files, whose cells can not contain units since they contain spaces.
+#Without a header the columns are named 0, 1, ... and the cells should carry their units.
+def read_chunks(file, chunk_size = 65536, delimiter = ",", header = True):
+    handle, close = _open(file, "r")
+    try:
+        rows = _split_rows(handle, delimiter)
+        columns = None
+        if header:
+            names = next(rows, None)
+            if names is None:
+                return
+            if delimiter is None:
+                #"p [bar]" is split on whitespace, the unit goes back to its name
+                merged = []
+                for name in names:
+                    if name.startswith("[") and merged:
+                        merged[-1] += " " + name
+                    else:
+                        merged.append(name)
+                names = merged
+            columns = []
+            for name in names:
+                match = _HEADER_UNIT.match(name)
+                if match is None:
+                    columns.append(_Column(name.strip(), None))
+                else:
+                    columns.append(_Column(match.group(1), match.group(2)))
+
+        start = 0
+        block = []
+        for row in rows:
+            if not row:
+                continue
+            if columns is None:
+                columns = [_Column(index, None) for index in range(len(row))]
+            block.append(row)
+            if len(block) == chunk_size:
+                yield _convert_block(columns, block, start)
+                start += len(block)
+                block = []
+        if block:
+            yield _convert_block(columns, block, start)
+    finally:
+        if close:
+            handle.close()
+
+
+def _convert_block(columns, block, start):
+    errors = []
+    width = len(columns)
+    for index, row in enumerate(block):
+        if len(row) != width:
+            errors.append((start + index, None, "Wrong number of cells in the row."))
+            block[index] = (row + [""] * width)[:width]
+
+    result = {}
+    for index, column in enumerate(columns):
+        result[column.name] = column.convert([row[index] for row in block], start, errors)
+    errors.sort(key = lambda error: error[0])
+    return Chunk(start, result, errors)
+
+
+#writes chunks ({name: QuantityArray} dicts or Chunk objects) as a table with the units of the
+#current output format in the header, so read_chunks reads it back
+def write_chunks(file, chunks, delimiter = ","):
+    handle, close = _open(file, "w")
+    try:
+        writer = csv.writer(handle, delimiter = delimiter, lineterminator = "\n")
+        fmt = compiled_format()
+        dimensions = None
+        for chunk in chunks:
+            columns = chunk.columns if isinstance(chunk, Chunk) else chunk
+            if dimensions is None:
+                dimensions = {name: column._dim for name, column in columns.items()}
+                header = []
+                for name, dimension in dimensions.items():
+                    suffix = fmt.render(dimension)[1].strip()
+                    header.append(str(name) + " [" + suffix + "]" if suffix else str(name))
+                writer.writerow(header)
+
+            cells = []
+            for name, dimension in dimensions.items():
+                column = columns.get(name)
+                if not isinstance(column, SiUnitQuantity) or column._dim is not dimension:
+                    raise TypeError("Unit mismatch in column " + str(name) + " between chunks.")
+                divisors = fmt.render(column._dim)[0]
+                magnitudes = np.asarray(column.magnitude, dtype = np.float64)
+                for divisor in divisors:
+                    magnitudes = magnitudes / divisor
+                cells.append([str(value) for value in magnitudes.tolist()])
+            writer.writerows(zip(*cells))
+    finally:
+        if close:
+            handle.close()
+
+
+##############################################################################
+
+#Binary columnar files: a magic number and the length of a JSON header, the header with the name,
+#dimension vector, display unit, shape and offset of every column, then the raw little-endian float64
+#magnitudes in basic SI units of each column, aligned to 64 bytes. read_binary maps the file into
+#memory, so the columns are read lazily from the file when they are used.
+
+_MAGIC = b"SIQB"
+_PREFIX = struct.Struct("<4sI")
+_ALIGNMENT = 64
+
+
+def _aligned(offset):
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+#result of read_binary
+#columns: {name: QuantityArray} backed by the memory-mapped file
+#units: {name: display unit or None} as given to write_binary
+class BinaryTable:
+
+    def __init__(self, columns, units):
+        self.columns = columns
+        self.units = units
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+
+#writes {name: QuantityArray or SiUnitQuantity} to a binary file. units optionally gives
+#{name: unit expression} kept as the display unit of a column, it must have the units of the column.
+def write_binary(file, columns, units = None):
+    units = {} if units is None else units
+    header = []
+    buffers = []
+    offset = 0
+    for name, column in columns.items():
+        if not isinstance(column, SiUnitQuantity):
+            raise TypeError("Wrong argument type. Function requires SiUnitQuantity instances.")
+        unit = units.get(name)
+        if unit is not None and si.UNIT_CACHE.lookup(unit.strip())[1] is not column.dimension:
+            raise TypeError("Unit mismatch in the display unit of column " + str(name) + ".")
+        magnitudes = np.asarray(column.magnitude, dtype = "<f8")
+        if not magnitudes.flags.c_contiguous:
+            magnitudes = magnitudes.copy()
+        header.append({"name": name, "dimension": list(column.dimension), "unit": unit, \
+                       "shape": list(magnitudes.shape), "offset": offset})
+        buffers.append(magnitudes)
+        offset = _aligned(offset + magnitudes.nbytes)
+
+    encoded = json.dumps({"columns": header}).encode("utf-8")
+    start = _aligned(_PREFIX.size + len(encoded))
+
+    handle, close = _open_binary(file, "wb")
+    try:
+        handle.write(_PREFIX.pack(_MAGIC, len(encoded)))
+        handle.write(encoded)
+        handle.write(b"\0" * (start - _PREFIX.size - len(encoded)))
+        position = 0
+        for entry, magnitudes in zip(header, buffers):
+            handle.write(b"\0" * (entry["offset"] - position))
+            handle.write(memoryview(magnitudes).cast("B"))
+            position = entry["offset"] + magnitudes.nbytes
+        handle.write(b"\0" * (offset - position))
+    finally:
+        if close:
+            handle.close()
+
+
+def _open_binary(file, mode):
+    if hasattr(file, "read") or hasattr(file, "write"):
+        return file, False
+    return open(file, mode), True
+
+
+#maps a file written by write_binary into memory and returns a BinaryTable. No data is copied,
+#slices of the columns are views of the file. mode is "r" for read-only, "r+" to write through
+#to the file or "c" for copy-on-write, as for numpy.memmap.
+def read_binary(path, mode = "r"):
+    with open(path, "rb") as handle:
+        magic, length = _PREFIX.unpack(handle.read(_PREFIX.size))
+        if magic != _MAGIC:
+            raise ValueError("Not a binary quantity file.")
+        header = json.loads(handle.read(length).decode("utf-8"))
+    start = _aligned(_PREFIX.size + length)
+
+    mapping = np.memmap(path, dtype = np.uint8, mode = mode)
+    columns = {}
+    units = {}
+    for entry in header["columns"]:
+        magnitudes = np.ndarray(tuple(entry["shape"]), dtype = "<f8", buffer = mapping, offset = start + entry["offset"])
+        columns[entry["name"]] = QuantityArray.from_dimension(magnitudes, intern_dimension(entry["dimension"]))
+        units[entry["name"]] = entry["unit"]
+    return BinaryTable(columns, units)
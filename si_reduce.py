@@ -0,0 +1,319 @@
+import itertools
+import math
+
+from si_class import SiUnitQuantity, DIMENSIONLESS, dimension_product
+
+#Reductions over iterables of quantities in one pass: the units are taken from the first item,
+#every other item is only checked against them by identity, and the raw magnitudes are accumulated
+#into a single result object. Generators are consumed lazily, never copied into a list.
+#A QuantityArray argument is reduced over all its elements with NumPy. A single scalar quantity is
+#refused, so si.min(a, b) is an error instead of taking b as the default. The options are keyword-only.
+#These are exported by si as si.sum, si.mean, si.min, si.max, si.dot and si.std. They shadow the
+#builtins of the same names in this module.
+
+_EMPTY = "Can not find the units of an empty sequence."
+_MISSING = object()
+
+
+#yields the magnitudes of the items, which all have to be in the given units. Plain numbers are
+#accepted as unitless quantities.
+def _magnitudes(items, dimension, error, message):
+    for item in items:
+        if isinstance(item, SiUnitQuantity):
+            if item._dim is not dimension:
+                raise error(message)
+            yield item.magnitude
+        elif dimension is DIMENSIONLESS:
+            yield item
+        else:
+            raise error(message)
+
+
+#returns (dimension, iterator over all items) or None for an empty iterable
+def _first(quantities):
+    iterator = iter(quantities)
+    for first in iterator:
+        dimension = first._dim if isinstance(first, SiUnitQuantity) else DIMENSIONLESS
+        return dimension, itertools.chain((first, ), iterator)
+    return None
+
+
+#True for a QuantityArray, TypeError for a scalar quantity, False for an iterable
+def _is_array(quantities):
+    if not isinstance(quantities, SiUnitQuantity):
+        return False
+    from array_class import QuantityArray
+    if isinstance(quantities, QuantityArray):
+        return True
+    raise TypeError("Needs an iterable of quantities or a QuantityArray, not a single SiUnitQuantity.")
+
+
+def _array_magnitudes(quantities):
+    import numpy as np
+    return np.asarray(quantities.magnitude, dtype = np.float64).ravel()
+
+
+#sum of the quantities. With compensated the magnitudes are added exactly with math.fsum.
+#An empty iterable gives a unitless 0.
+def sum(quantities, *, compensated = False):
+    if _is_array(quantities):
+        magnitudes = _array_magnitudes(quantities)
+        total = math.fsum(magnitudes.tolist()) if compensated else float(magnitudes.sum())
+        return SiUnitQuantity.from_dimension(total, quantities._dim)
+
+    first = _first(quantities)
+    if first is None:
+        return SiUnitQuantity.from_dimension(0, DIMENSIONLESS)
+    dimension, items = first
+    magnitudes = _magnitudes(items, dimension, TypeError, "Unit mismatch in adding two SiUnitQuantities")
+    if compensated:
+        return SiUnitQuantity.from_dimension(math.fsum(magnitudes), dimension)
+    total = 0
+    for magnitude in magnitudes:
+        total += magnitude
+    return SiUnitQuantity.from_dimension(total, dimension)
+
+
+#arithmetic mean of the quantities, counted while summing
+def mean(quantities, *, compensated = False):
+    if _is_array(quantities):
+        magnitudes = _array_magnitudes(quantities)
+        if magnitudes.size == 0:
+            raise ValueError(_EMPTY)
+        total = math.fsum(magnitudes.tolist()) if compensated else float(magnitudes.sum())
+        return SiUnitQuantity.from_dimension(total / magnitudes.size, quantities._dim)
+
+    first = _first(quantities)
+    if first is None:
+        raise ValueError(_EMPTY)
+    dimension, items = first
+    count = 0
+    def counted(magnitudes):
+        nonlocal count
+        for magnitude in magnitudes:
+            count += 1
+            yield magnitude
+    magnitudes = counted(_magnitudes(items, dimension, TypeError, "Unit mismatch in adding two SiUnitQuantities"))
+    if compensated:
+        total = math.fsum(magnitudes)
+    else:
+        total = 0
+        for magnitude in magnitudes:
+            total += magnitude
+    return SiUnitQuantity.from_dimension(total / count, dimension)
+
+
+#standard deviation of the quantities (ddof as in NumPy, NaN if count <= ddof), by Welford's single pass update
+def std(quantities, *, ddof = 0):
+    if _is_array(quantities):
+        magnitudes = _array_magnitudes(quantities)
+        if magnitudes.size == 0:
+            raise ValueError(_EMPTY)
+        return SiUnitQuantity.from_dimension(float(magnitudes.std(ddof = ddof)), quantities._dim)
+
+    first = _first(quantities)
+    if first is None:
+        raise ValueError(_EMPTY)
+    dimension, items = first
+    count = 0
+    average = 0.0
+    squares = 0.0
+    for magnitude in _magnitudes(items, dimension, TypeError, "Unit mismatch in adding two SiUnitQuantities"):
+        count += 1
+        delta = magnitude - average
+        average += delta / count
+        squares += delta * (magnitude - average)
+    if count <= ddof:
+        #as np.std, no degrees of freedom left gives NaN
+        return SiUnitQuantity.from_dimension(math.nan, dimension)
+    return SiUnitQuantity.from_dimension(math.sqrt(squares / (count - ddof)), dimension)
+
+
+def _extreme(quantities, default, smaller):
+    if _is_array(quantities):
+        magnitudes = _array_magnitudes(quantities)
+        if magnitudes.size == 0:
+            if default is not _MISSING:
+                return default
+            raise ValueError(_EMPTY)
+        return SiUnitQuantity.from_dimension(float(magnitudes.min() if smaller else magnitudes.max()), quantities._dim)
+
+    first = _first(quantities)
+    if first is None:
+        if default is not _MISSING:
+            return default
+        raise ValueError(_EMPTY)
+    dimension, items = first
+    best = None
+    best_magnitude = None
+    for item in items:
+        if isinstance(item, SiUnitQuantity):
+            if item._dim is not dimension:
+                raise ValueError('Quantities with different units cannot be compared')
+            magnitude = item.magnitude
+        elif dimension is DIMENSIONLESS:
+            magnitude = item
+        else:
+            raise ValueError('Quantities with different units cannot be compared')
+        if best is None or (magnitude < best_magnitude if smaller else magnitude > best_magnitude):
+            best = item
+            best_magnitude = magnitude
+    return best
+
+
+#smallest of the quantities, the item itself is returned as by the builtin min
+def min(quantities, *, default = _MISSING):
+    return _extreme(quantities, default, True)
+
+
+def max(quantities, *, default = _MISSING):
+    return _extreme(quantities, default, False)
+
+
+#sum of the products of the paired items of two iterables of the same length
+def dot(left, right, *, compensated = False):
+    left_array, right_array = _is_array(left), _is_array(right)
+    if left_array and right_array:
+        left_magnitudes = _array_magnitudes(left)
+        right_magnitudes = _array_magnitudes(right)
+        if left_magnitudes.size != right_magnitudes.size:
+            raise ValueError("Sequences of different lengths.")
+        if compensated:
+            total = math.fsum((left_magnitudes * right_magnitudes).tolist())
+        else:
+            total = float(left_magnitudes.dot(right_magnitudes))
+        return SiUnitQuantity.from_dimension(total, dimension_product(left._dim, right._dim))
+
+    left_dimension = right_dimension = None
+    def products():
+        nonlocal left_dimension, right_dimension
+        for a, b in itertools.zip_longest(left, right, fillvalue = _MISSING):
+            if a is _MISSING or b is _MISSING:
+                raise ValueError("Sequences of different lengths.")
+            a_dimension = DIMENSIONLESS
+            if isinstance(a, SiUnitQuantity):
+                a_dimension, a = a._dim, a.magnitude
+            b_dimension = DIMENSIONLESS
+            if isinstance(b, SiUnitQuantity):
+                b_dimension, b = b._dim, b.magnitude
+            if left_dimension is None:
+                left_dimension, right_dimension = a_dimension, b_dimension
+            elif a_dimension is not left_dimension or b_dimension is not right_dimension:
+                raise TypeError("Unit mismatch in adding two SiUnitQuantities")
+            yield a * b
+
+    if compensated:
+        total = math.fsum(products())
+    else:
+        total = 0
+        for product in products():
+            total += product
+    if left_dimension is None:
+        return SiUnitQuantity.from_dimension(0, DIMENSIONLESS)
+    return SiUnitQuantity.from_dimension(total, dimension_product(left_dimension, right_dimension))
+
+
+#Running total for integration loops, x += v * dt without allocating a quantity at every step:
+#    position = si.Accumulator(0 * si.Units.m)
+#    for v in speeds:
+#        position.add_product(v, dt)
+#    position.value   # SiUnitQuantity
+#The units are fixed by the initial value and checked by identity on every update. An array initial
+#value is copied and then updated in place. With compensated the rounding errors of the updates are
+#carried along (Neumaier), so long runs of small steps do not drift.
+class Accumulator:
+    __slots__ = ("total", "_dim", "_compensation")
+
+    def __init__(self, initial, compensated = False):
+        if not isinstance(initial, SiUnitQuantity):
+            initial = SiUnitQuantity.from_dimension(initial, DIMENSIONLESS)
+        magnitude = initial.magnitude
+        if hasattr(magnitude, "copy"):
+            magnitude = magnitude.copy()
+        self.total = magnitude
+        self._dim = initial._dim
+        self._compensation = 0.0 if compensated else None
+
+    @property
+    def dimension(self):
+        return self._dim
+
+    @property
+    def value(self):
+        total = self.total
+        if self._compensation is not None:
+            total = total + self._compensation
+        elif hasattr(total, "copy"):
+            total = total.copy()
+        return SiUnitQuantity.from_dimension(total, self._dim) if getattr(total, "ndim", 0) == 0 \
+               else _array(total, self._dim)
+
+    def _update(self, magnitude):
+        if self._compensation is None:
+            self.total += magnitude
+            return
+        total = self.total + magnitude
+        if getattr(total, "ndim", 0) == 0:
+            if abs(self.total) >= abs(magnitude):
+                self._compensation += (self.total - total) + magnitude
+            else:
+                self._compensation += (magnitude - total) + self.total
+        else:
+            import numpy as np
+            self._compensation = self._compensation + np.where(np.abs(self.total) >= np.abs(magnitude), \
+                                                               (self.total - total) + magnitude, (magnitude - total) + self.total)
+        self.total = total
+
+    def _magnitude(self, value):
+        if isinstance(value, SiUnitQuantity):
+            if value._dim is not self._dim:
+                raise TypeError("Unit mismatch in adding two SiUnitQuantities")
+            return value.magnitude
+        if self._dim is not DIMENSIONLESS:
+            raise TypeError("Unit mismatch in adding SiUnitQuantity and a non-SiUnitQuantity")
+        return value
+
+    #adds a quantity in the units of the accumulator
+    def add(self, value):
+        self._update(self._magnitude(value))
+        return self
+
+    def subtract(self, value):
+        self._update(-self._magnitude(value))
+        return self
+
+    #adds rate * step, whose units have to be the units of the accumulator
+    def add_product(self, rate, step):
+        rate_dimension = DIMENSIONLESS
+        if isinstance(rate, SiUnitQuantity):
+            rate_dimension, rate = rate._dim, rate.magnitude
+        step_dimension = DIMENSIONLESS
+        if isinstance(step, SiUnitQuantity):
+            step_dimension, step = step._dim, step.magnitude
+        if dimension_product(rate_dimension, step_dimension) is not self._dim:
+            raise TypeError("Unit mismatch in adding two SiUnitQuantities")
+        self._update(rate * step)
+        return self
+
+    def __iadd__(self, value):
+        return self.add(value)
+
+    def __isub__(self, value):
+        return self.subtract(value)
+
+    def __str__(self):
+        return str(self.value)
+
+    def reset(self, initial = 0):
+        if isinstance(initial, SiUnitQuantity):
+            if initial._dim is not self._dim:
+                raise TypeError("Unit mismatch in assigning to Accumulator")
+            initial = initial.magnitude
+        self.total = initial.copy() if hasattr(initial, "copy") else initial
+        if self._compensation is not None:
+            self._compensation = 0.0
+
+
+def _array(magnitude, dimension):
+    from array_class import QuantityArray
+    return QuantityArray.from_dimension(magnitude, dimension)
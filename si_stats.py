@@ -0,0 +1,161 @@
+import json
+import threading
+import time
+from collections import defaultdict
+
+import si
+import si_class
+import array_class
+import unit_parser
+from si_class import SiUnitQuantity, OutputFormat
+from array_class import QuantityArray
+
+#Opt-in instrumentation of the hot paths. enable() replaces the instrumented methods and functions
+#with counting wrappers and disable() puts the originals back, so nothing is measured and nothing
+#costs anything while it is off. Counts are plain dict updates without a lock, under many threads
+#they are close but not exact. Set SI_STATS=1 in the environment to enable it when si is imported.
+#
+#    si_stats.enable()
+#    ... workload ...
+#    print(si_stats.snapshot())
+
+_CALLS = defaultdict(int)
+_TIME = defaultdict(float)
+_ERRORS = defaultdict(int)
+_ALLOCATIONS = defaultdict(int)
+
+_OPERATORS = ("__add__", "__radd__", "__sub__", "__rsub__", "__mul__", "__rmul__", "__truediv__", "__rtruediv__", \
+              "__pow__", "__rpow__", "__eq__", "__lt__", "__gt__", "__le__", "__ge__", "__str__")
+
+#(owner, attribute name, reported name) of everything that is timed
+_TIMED = [(SiUnitQuantity, name, "SiUnitQuantity." + name) for name in _OPERATORS] + \
+         [(QuantityArray, name, "QuantityArray." + name) for name in _OPERATORS if name in QuantityArray.__dict__] + \
+         [(OutputFormat, "__init__", "OutputFormat.compile"), (OutputFormat, "coefficients", "OutputFormat.coefficients"), \
+          (si, "new", "si.new"), (si, "new_many", "si.new_many"), (si, "format_many", "si.format_many"), \
+          (si, "set_format", "si.set_format"), (si, "replace", "si.replace"), (si, "get_unit", "si.get_unit"), \
+          (si, "compile_unit", "si.compile_unit"), (unit_parser, "parse", "unit_parser.parse")]
+
+#(owner, attribute name) of the constructors whose results are counted as allocations
+_ALLOCATORS = [(si_class, "_quantity"), (array_class, "_quantity"), (array_class, "_array")]
+
+_originals = []
+_lock = threading.Lock()
+_dumper = None
+
+
+def _timed(function, key):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        except (TypeError, ValueError):
+            #unit mismatches, wrong formats and unknown units
+            _ERRORS[key] += 1
+            raise
+        finally:
+            _CALLS[key] += 1
+            _TIME[key] += time.perf_counter() - start
+    wrapper.__name__ = getattr(function, "__name__", key)
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def _allocating(function):
+    def wrapper(magnitude, dimension):
+        quantity = function(magnitude, dimension)
+        _ALLOCATIONS[type(quantity).__name__] += 1
+        return quantity
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def _counting_init(function):
+    def wrapper(self, *args, **kwargs):
+        function(self, *args, **kwargs)
+        _ALLOCATIONS[type(self).__name__] += 1
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def _counting_from_dimension(function):
+    def from_dimension(cls, magnitude, dimension):
+        _ALLOCATIONS[cls.__name__] += 1
+        return function(cls, magnitude, dimension)
+    return classmethod(from_dimension)
+
+
+def _replace(owner, name, value):
+    _originals.append((owner, name, owner.__dict__[name]))
+    setattr(owner, name, value)
+
+
+def is_enabled():
+    return bool(_originals)
+
+
+def enable():
+    with _lock:
+        if _originals:
+            return
+        for owner, name, key in _TIMED:
+            _replace(owner, name, _timed(getattr(owner, name), key))
+        for owner, name in _ALLOCATORS:
+            _replace(owner, name, _allocating(getattr(owner, name)))
+        #QuantityArray.__init__ calls SiUnitQuantity.__init__, so every object is counted once
+        _replace(SiUnitQuantity, "__init__", _counting_init(SiUnitQuantity.__init__))
+        _replace(SiUnitQuantity, "from_dimension", _counting_from_dimension(SiUnitQuantity.from_dimension.__func__))
+
+
+def disable():
+    with _lock:
+        while _originals:
+            owner, name, value = _originals.pop()
+            setattr(owner, name, value)
+
+
+def reset():
+    _CALLS.clear()
+    _TIME.clear()
+    _ERRORS.clear()
+    _ALLOCATIONS.clear()
+
+
+#returns the counters as a dict of plain values, ready for json.dumps
+def snapshot():
+    return {"enabled": is_enabled(), \
+            "calls": dict(_CALLS), \
+            "time": dict(_TIME), \
+            "errors": dict(_ERRORS), \
+            "allocations": dict(_ALLOCATIONS), \
+            "unit_cache": si.unit_cache_info()}
+
+
+#appends a JSON line with a timestamped snapshot to file every interval seconds, from a daemon thread.
+#file is a path or an object with write(). Only one dump runs at a time.
+def start_dump(file, interval = 60.0):
+    global _dumper
+    stop_dump()
+    stop = threading.Event()
+
+    def dump():
+        while not stop.wait(interval):
+            line = json.dumps(dict(snapshot(), timestamp = time.time())) + "\n"
+            if hasattr(file, "write"):
+                file.write(line)
+                file.flush()
+            else:
+                with open(file, "a") as handle:
+                    handle.write(line)
+
+    thread = threading.Thread(target = dump, name = "si_stats dump", daemon = True)
+    thread.start()
+    _dumper = (thread, stop)
+
+
+def stop_dump():
+    global _dumper
+    if _dumper is not None:
+        thread, stop = _dumper
+        stop.set()
+        thread.join()
+        _dumper = None
@@ -1,5 +1,18 @@
+import io
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
 import unittest
 
+import numpy as np
+
+import benchmark
+import si
+import si_io
+import si_stats
 from natural import *
 
 class TestBuiltins(unittest.TestCase):
@@ -25,6 +38,22 @@ class TestBuiltins(unittest.TestCase):
         self.assertFalse(unit_1.match_units(unitless_2))
         self.assertFalse(unitless_1.match_units(unit_2))
 
+    def test_shared_dimensions(self):
+        len_1 = SiUnitQuantity(magnitude = 2.7, exponents = {"length": 1})
+        len_2 = SiUnitQuantity(magnitude = 5.4, exponents = {"length": 1, "time": 0})
+        area_1 = len_1 * len_2
+        self.assertIs(len_1.dimension, len_2.dimension)
+        self.assertIs((area_1 / len_1).dimension, len_1.dimension)
+        self.assertEqual(area_1.exponents["length"], 2)
+        self.assertEqual(area_1.exponents["amount of substance"], 0)
+        with self.assertRaises(TypeError):
+            area_1.exponents["length"] = 3
+        area_1.exponents = dict(area_1.exponents, length = 3)
+        self.assertEqual(area_1.exponents["length"], 3)
+        self.assertTrue(SiUnitQuantity(magnitude = 1).is_unitless())
+        with self.assertRaises(AttributeError):
+            len_1.note = "no per-instance dict"
+
     def test_str_simple_1(self):
         velocity_1 = SiUnitQuantity(magnitude = 7, exponents = {"length": 1, "time": -1})
         self.assertEqual(str(velocity_1), "7 m/s")
@@ -35,6 +64,91 @@ class TestBuiltins(unittest.TestCase):
     def test_str_as_repr(self):
         pass # upcoming: parser
 
+class TestFormat(unittest.TestCase):
+    def tearDown(self):
+        si.set_default_format()
+        if "eV" in si.REGISTRY:
+            si.delete_unit("eV")
+
+    def test_str_custom_format(self):
+        power_1 = SiUnitQuantity(magnitude = 3, exponents = {"length": 2, "mass": 1, "time": -3})
+        si.set_format(["kg", "J", "s", "A", "K", "mol"])
+        self.assertEqual(str(power_1), "3 J/s")
+        si.replace({"J": "kJ"})
+        self.assertEqual(str(power_1), "0.003 kJ/s")
+        units_1 = ["kg", "J", "s", "A", "K", "mol"]
+        si.set_format(units_1)
+        units_1[1] = "kJ"
+        self.assertEqual(str(power_1), "3 J/s")
+        SiUnitQuantity.FORMAT[1] = "kJ"
+        self.assertEqual(str(power_1), "0.003 kJ/s")
+        si.set_default_format()
+        self.assertEqual(str(power_1), "3 (kg * m^2)/s^3")
+
+    def test_bad_format(self):
+        with self.assertRaises(ValueError):
+            si.set_format(["kg", "m", "s"])
+        with self.assertRaises(ValueError):
+            si.set_format(["kg", "m", "g", "A", "K", "mol"])
+        with self.assertRaises(TypeError):
+            si.set_format(["kg", "m", "xyz", "A", "K", "mol"])
+
+    def test_user_unit_in_format(self):
+        si.set_unit("eV", 1.6e-19 * si.Units.J)
+        si.set_format(["kg", "eV", "s", "A", "K", "mol"])
+        self.assertEqual(str(3.2e-19 * si.Units.J), "2.0 eV")
+        si.set_default_format()
+        si.delete_unit("eV")
+        si.SiUnitQuantity.FORMAT = ["kg", "eV", "s", "A", "K", "mol"]
+        with self.assertRaises(TypeError):
+            str(si.Units.J)
+
+    def test_format_many(self):
+        values_1 = [7 * si.Units.m / si.Units.s, 2.5e-3 * si.Units.J, SiUnitQuantity(magnitude = 4), 1.25 * si.Units.m / si.Units.s]
+        self.assertEqual(si.format_many(values_1), [str(value) for value in values_1])
+        si.set_format(["g", "m", "ms", "A", "K", "mol"])
+        self.assertEqual(si.format_many(values_1), [str(value) for value in values_1])
+        len_1 = si.QuantityArray([0.1, 2.0, 3e-9], exponents = {"length": 1})
+        self.assertEqual(si.format_many(len_1), [str(value) for value in len_1])
+        self.assertEqual(si.format_many(values_1[:1], precision = 2), ["0.007 m/ms"])
+
+    def test_auto_prefix(self):
+        time_1 = 3.2e-9 * si.Units.s
+        speed_1 = 12345.0 * si.Units.m / si.Units.s
+        with si.auto_prefix():
+            self.assertEqual(str(time_1), "3.2 ns")
+            self.assertEqual(str(speed_1), "12.345 km/s")
+            self.assertEqual(str(2.5e-6 * si.Units.kg), "2.5 mg")
+            self.assertEqual(str(1e-7 * si.Units.kg), "100.0 ug")
+            self.assertEqual(str(SiUnitQuantity(magnitude = 4)), "4")
+        self.assertEqual(str(time_1), "3.2e-09 s")
+        self.assertEqual(si.get_format(), ["kg", "m", "s", "A", "K", "mol"])
+        times_1 = si.QuantityArray([3.2e-9, 4.7e-6, 0.0, 2.0], exponents = {"time": 1})
+        self.assertEqual(si.format_many(times_1, auto_prefix = True), ["3.2 ns", "4.7 us", "0.0 s", "2.0 s"])
+        self.assertEqual(si.format_many([1e-7 * si.Units.kg, 3e-4 * si.Units.m], auto_prefix = True), ["100.0 ug", "300.0 um"])
+        si.set_format(["kg", "J", "s", "A", "K", "mol"])
+        self.assertEqual(si.format_many([2.5e4 * si.Units.W], auto_prefix = True), ["25.0 kJ/s"])
+
+    def test_format_context(self):
+        power_1 = SiUnitQuantity(magnitude = 3, exponents = {"length": 2, "mass": 1, "time": -3})
+        with si.format_context(["kg", "J", "s", "A", "K", "mol"]):
+            self.assertEqual(str(power_1), "3 J/s")
+            si.replace({"J": "kJ"})
+            self.assertEqual(str(power_1), "0.003 kJ/s")
+        self.assertEqual(si.get_format(), ["kg", "m", "s", "A", "K", "mol"])
+
+        results = {}
+        def render(unit):
+            with si.format_context(["kg", unit, "s", "A", "K", "mol"]):
+                results[unit] = [str(3 * si.Units.m) for i in range(200)]
+        threads = [threading.Thread(target = render, args = (unit,)) for unit in ("m", "km", "mm")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(set(results["km"]), {"0.003 km"})
+        self.assertEqual(set(results["mm"]), {"3000.0 mm"})
+
 class TestArithmetic(unittest.TestCase):
     def test_add_simple(self):
         unitless_1 = SiUnitQuantity(magnitude = 1.2) + SiUnitQuantity(magnitude = -0.9)
@@ -74,5 +188,531 @@ class TestArithmetic(unittest.TestCase):
         with self.assertRaises(TypeError):
             bad_quantity_3 = acc_1 - power_1
 
+class TestQuantityArray(unittest.TestCase):
+    def test_arithmetic(self):
+        len_1 = si.QuantityArray([1.0, 2.0, 3.0], exponents = {"length": 1})
+        time_1 = SiUnitQuantity(magnitude = 2, exponents = {"time": 1})
+        vel_1 = len_1 / time_1
+        self.assertTrue(vel_1.match_units(si.Units.m / si.Units.s))
+        self.assertEqual(list(vel_1.magnitude), [0.5, 1.0, 1.5])
+        self.assertEqual(list((time_1 * len_1).magnitude), [2.0, 4.0, 6.0])
+        self.assertTrue((len_1 ** 2).match_units(si.Units.m ** 2))
+        self.assertEqual(list((len_1 - si.Units.m).magnitude), [0.0, 1.0, 2.0])
+        len_2 = si.QuantityArray([1 * si.Units.m, 2 * si.Units.m])
+        self.assertTrue(len_2.match_units(si.Units.m))
+        self.assertEqual(list(len_2.magnitude), [1.0, 2.0])
+        with self.assertRaises(TypeError):
+            si.QuantityArray([1 * si.Units.m, 2 * si.Units.s])
+        with self.assertRaises(TypeError):
+            si.QuantityArray([1 * si.Units.m, 2.0])
+        with self.assertRaises(TypeError):
+            si.QuantityArray([1 * si.Units.m], exponents = {"time": 1})
+        with self.assertRaises(TypeError):
+            len_1 + time_1
+        with self.assertRaises(ValueError):
+            len_1 < time_1
+
+    def test_indexing(self):
+        len_1 = si.QuantityArray([1.0, 2.0, 3.0], exponents = {"length": 1})
+        self.assertIsInstance(len_1[0], SiUnitQuantity)
+        self.assertEqual(len_1[2].magnitude, 3.0)
+        tail_1 = len_1[1:]
+        tail_1[0] = 5 * si.Units.m
+        self.assertEqual(len_1[1].magnitude, 5.0)
+        with self.assertRaises(TypeError):
+            len_1[0] = si.Units.s
+        self.assertEqual(list(len_1 > 2 * si.Units.m), [False, True, True])
+
+class TestNumpyProtocols(unittest.TestCase):
+    def test_ufuncs(self):
+        area_1 = si.QuantityArray([1.0, 4.0, 9.0], exponents = {"length": 2})
+        self.assertTrue(np.sqrt(area_1).match_units(si.Units.m))
+        self.assertEqual(list(np.sqrt(area_1).magnitude), [1.0, 2.0, 3.0])
+        self.assertAlmostEqual(np.exp(SiUnitQuantity(magnitude = 0)).magnitude, 1.0)
+        with self.assertRaises(ValueError):
+            np.exp(si.Units.m)
+        with self.assertRaises(TypeError):
+            np.add(area_1, si.Units.m)
+
+    def test_reductions(self):
+        len_1 = si.QuantityArray([1.0, 2.0, 3.0], exponents = {"length": 1})
+        self.assertEqual(np.sum(len_1).magnitude, 6.0)
+        self.assertTrue(np.mean(len_1).match_units(si.Units.m))
+        self.assertEqual(np.max(len_1).magnitude, 3.0)
+        self.assertEqual(list(np.cumsum(len_1).magnitude), [1.0, 3.0, 6.0])
+        self.assertTrue(np.var(len_1).match_units(si.Units.m ** 2))
+
+    def test_function_units(self):
+        len_1 = si.QuantityArray([1.0, 2.0, 2.0], exponents = {"length": 1})
+        with self.assertRaises(TypeError):
+            np.concatenate([len_1, np.array([5.0])])
+        with self.assertRaises(TypeError):
+            np.where(len_1.magnitude > 1, len_1, 0.0)
+        with self.assertRaises(TypeError):
+            np.clip(len_1, 0, 1.5)
+        self.assertEqual(list(np.clip(len_1, 0 * si.Units.m, 1.5 * si.Units.m).magnitude), [1.0, 1.5, 1.5])
+        self.assertTrue(np.where(len_1.magnitude > 1, len_1, 0 * si.Units.m).match_units(si.Units.m))
+        values_1, counts_1 = np.unique(len_1, return_counts = True)
+        self.assertTrue(values_1.match_units(si.Units.m))
+        self.assertEqual(list(counts_1), [1, 2])
+        self.assertTrue(np.matmul(len_1, len_1).match_units(si.Units.m ** 2))
+        self.assertEqual(np.matmul(len_1, len_1).magnitude, 9.0)
+
+class TestNew(unittest.TestCase):
+    def test_new_simple(self):
+        acc_1 = si.new("9.81 m/(s*s)")
+        self.assertTrue(acc_1.match_units(si.Units.m / si.Units.s ** 2))
+        self.assertAlmostEqual(acc_1.magnitude, 9.81)
+        self.assertAlmostEqual(si.new("-2.5e3 mm").magnitude, -2.5)
+        self.assertTrue(si.new("4").is_unitless())
+        with self.assertRaises(ValueError):
+            si.new("5 xyz")
+
+    def test_new_exponents(self):
+        self.assertTrue(si.new("2 m^2").match_units(si.Units.m ** 2))
+        self.assertTrue(si.new("2 m**-1").match_units(1 / si.Units.m))
+        self.assertTrue(si.new("4 m^(1/2)").match_units(si.Units.m ** 0.5))
+        self.assertTrue(si.new("3 kg*m^2/(s^2*(A*s))").match_units(si.Units.J / si.Units.C))
+        self.assertTrue(si.new("1 /s").match_units(si.Units.Hz))
+        self.assertTrue(si.new("3 N m").match_units(si.Units.J))
+        self.assertTrue(si.new("2 kg (m/s)").match_units(si.Units.kg * si.Units.m / si.Units.s))
+        self.assertTrue(si.new("2 kg(m)").match_units(si.Units.kg * si.Units.m))
+        self.assertTrue(si.new("2 (kg) (m)").match_units(si.Units.kg * si.Units.m))
+        with self.assertRaises(ValueError):
+            si.new("5 m ()")
+        with self.assertRaises(ValueError):
+            si.new("5 (m")
+        with self.assertRaises(ValueError):
+            si.new("5 m^s")
+        long_1 = si.new("1 " + "*".join(["m"] * 3000) + "/" + "/".join(["m"] * 2999))
+        self.assertTrue(long_1.match_units(si.Units.m))
+
+    def test_unit_cache(self):
+        si.new("1.5 kPa")
+        hits = si.unit_cache_info()["hits"]
+        si.new("2.5 kPa")
+        self.assertEqual(si.unit_cache_info()["hits"], hits + 1)
+        si.set_unit("eV", 1.6e-19 * si.Units.J)
+        self.assertAlmostEqual(si.new("2 keV").magnitude, 3.2e-16)
+        si.delete_unit("eV")
+        with self.assertRaises(ValueError):
+            si.new("2 keV")
+
+    def test_registry(self):
+        self.assertAlmostEqual(si.REGISTRY.lookup("mm")[0], 1e-3)
+        self.assertIs(si.REGISTRY.lookup("T")[1], si.Units.T.dimension)
+        self.assertIsNone(si.REGISTRY.lookup("xyz"))
+        version = si.REGISTRY.version
+        si.set_unit("eV", 1.6e-19 * si.Units.J)
+        self.assertNotEqual(si.REGISTRY.version, version)
+        si.delete_unit("eV")
+        with self.assertRaises(ValueError):
+            si.delete_unit("m")
+        with self.assertRaises(ValueError):
+            si.set_unit("km", si.Units.m)
+
+class TestGrouping(unittest.TestCase):
+    def test_hash(self):
+        self.assertEqual(len({2 * si.Units.m, 2.0 * si.Units.m, 3 * si.Units.m, 2 * si.Units.s}), 3)
+        self.assertEqual(hash(SiUnitQuantity(magnitude = 4)), hash(4))
+        counts_1 = {si.Units.N.dimension: 1}
+        self.assertIn(si.Units.kg * si.Units.m / si.Units.s ** 2, {si.Units.N: 1})
+        self.assertIn((si.Units.J / si.Units.m).dimension, counts_1)
+
+    def test_group_by_dimension(self):
+        values_1 = [2 * si.Units.m, 3 * si.Units.s, si.QuantityArray([4.0, 5.0], exponents = {"length": 1}), 6 * si.Units.s]
+        groups_1 = si.group_by_dimension(values_1)
+        self.assertEqual(list(groups_1), [si.Units.m.dimension, si.Units.s.dimension])
+        self.assertEqual(groups_1[si.Units.m.dimension].magnitude.tolist(), [2.0, 4.0, 5.0])
+        self.assertEqual(groups_1[si.Units.s.dimension].magnitude.tolist(), [3.0, 6.0])
+        with self.assertRaises(TypeError):
+            si.group_by_dimension([1.0])
+
+class TestReductions(unittest.TestCase):
+    def test_sum_mean(self):
+        lengths_1 = (i * si.Units.m for i in range(1, 5))
+        total_1 = si.sum(lengths_1)
+        self.assertTrue(total_1.match_units(si.Units.m))
+        self.assertEqual(total_1.magnitude, 10)
+        self.assertEqual(si.sum([0.1 * si.Units.s] * 10, compensated = True).magnitude, 1.0)
+        self.assertAlmostEqual(si.mean(iter([2 * si.Units.J, 4 * si.Units.J])).magnitude, 3.0)
+        self.assertAlmostEqual(si.std([2 * si.Units.J, 4 * si.Units.J]).magnitude, 1.0)
+        single_1 = si.std([si.Units.m], ddof = 1)
+        self.assertTrue(np.isnan(single_1.magnitude))
+        self.assertTrue(single_1.match_units(si.Units.m))
+        self.assertAlmostEqual(si.mean(si.QuantityArray([1.0, 2.0], exponents = {"time": 1})).magnitude, 1.5)
+        with self.assertRaises(TypeError):
+            si.sum([si.Units.m, si.Units.s])
+        with self.assertRaises(ValueError):
+            si.mean([])
+        self.assertEqual(sum([1, 2]), 3)
+
+    def test_min_max_dot(self):
+        speeds_1 = [3 * si.Units.m / si.Units.s, 1 * si.Units.m / si.Units.s, 2 * si.Units.m / si.Units.s]
+        self.assertIs(si.min(speeds_1), speeds_1[1])
+        self.assertIs(si.max(iter(speeds_1)), speeds_1[0])
+        self.assertIsNone(si.max([], default = None))
+        with self.assertRaises(ValueError):
+            si.min([si.Units.m, si.Units.s])
+        work_1 = si.dot([si.Units.N, 2 * si.Units.N], (3 * si.Units.m for i in range(2)))
+        self.assertTrue(work_1.match_units(si.Units.J))
+        self.assertEqual(work_1.magnitude, 9)
+        with self.assertRaises(ValueError):
+            si.dot([si.Units.N], [si.Units.m, si.Units.m])
+
+    def test_scalar_arguments(self):
+        with self.assertRaises(TypeError):
+            si.min(3 * si.Units.m, 1 * si.Units.m)
+        with self.assertRaises(TypeError):
+            si.sum(si.Units.m, si.Units.m)
+        with self.assertRaises(TypeError):
+            si.max(si.Units.m)
+        with self.assertRaises(TypeError):
+            si.dot([si.Units.m], si.Units.m)
+        self.assertEqual(si.min([3 * si.Units.m, 1 * si.Units.m]).magnitude, 1)
+        names_1 = {}
+        exec("from si import *", names_1)
+        for name in ("sum", "min", "max", "compile"):
+            self.assertNotIn(name, names_1)
+        self.assertIn("Units", names_1)
+
+class TestInPlace(unittest.TestCase):
+    def test_array_in_place(self):
+        lengths_1 = si.QuantityArray([1.0, 2.0], exponents = {"length": 1})
+        buffer_1 = lengths_1.magnitude
+        lengths_1 += 3 * si.Units.m
+        lengths_1 -= si.QuantityArray([1.0, 1.0], exponents = {"length": 1})
+        lengths_1 /= 2 * si.Units.s
+        self.assertIs(lengths_1.magnitude, buffer_1)
+        self.assertEqual(buffer_1.tolist(), [1.5, 2.0])
+        self.assertTrue(lengths_1.match_units(si.Units.m / si.Units.s))
+        with self.assertRaises(TypeError):
+            lengths_1 += si.Units.m
+        unit_1 = si.Units.m
+        unit_1 += si.Units.m
+        self.assertEqual(si.Units.m.magnitude, 1)
+
+    def test_accumulator(self):
+        position_1 = si.Accumulator(0 * si.Units.m)
+        for i in range(10):
+            position_1.add_product(2 * si.Units.m / si.Units.s, 0.1 * si.Units.s)
+        position_1 -= 1 * si.Units.m
+        self.assertTrue(position_1.value.match_units(si.Units.m))
+        self.assertAlmostEqual(position_1.value.magnitude, 1.0)
+        with self.assertRaises(TypeError):
+            position_1 += si.Units.s
+        total_1 = si.Accumulator(0 * si.Units.s, compensated = True)
+        for i in range(10):
+            total_1 += 0.1 * si.Units.s
+        self.assertEqual(total_1.value.magnitude, 1.0)
+        field_1 = si.Accumulator(si.QuantityArray([0.0, 0.0], exponents = {"time": 1}))
+        field_1 += si.QuantityArray([1.0, 2.0], exponents = {"time": 1})
+        self.assertEqual(field_1.value.magnitude.tolist(), [1.0, 2.0])
+
+class TestUncertain(unittest.TestCase):
+    def test_propagation(self):
+        length_1 = si.UncertainArray([3.0, 6.0], 0.3, exponents = {"length": 1})
+        time_1 = si.UncertainArray([2.0, 2.0], 0.4, exponents = {"time": 1})
+        speed_1 = length_1 / time_1
+        self.assertTrue(speed_1.match_units(si.Units.m / si.Units.s))
+        np.testing.assert_allclose(speed_1.sigma, speed_1.magnitude * np.hypot(0.3 / length_1.magnitude, 0.2))
+        np.testing.assert_allclose((length_1 * length_1).sigma, 2 * length_1.magnitude * 0.3)
+        np.testing.assert_allclose((length_1 ** 2).sigma, 2 * length_1.magnitude * 0.3)
+        np.testing.assert_allclose((length_1 + 1 * si.Units.m).sigma, [0.3, 0.3])
+        with self.assertRaises(TypeError):
+            length_1 + time_1
+        with self.assertRaises(TypeError):
+            np.sqrt(length_1)
+
+    def test_correlations(self):
+        length_1 = si.UncertainArray([3.0, 6.0], 0.3, exponents = {"length": 1}, track = True)
+        length_2 = si.UncertainArray([1.0, 1.0], 0.4, exponents = {"length": 1})
+        np.testing.assert_allclose((length_1 - length_1 / 2 * 2).sigma, [0.0, 0.0])
+        total_1 = length_1 + length_2
+        np.testing.assert_allclose(total_1.sigma, [0.5, 0.5])
+        np.testing.assert_allclose(total_1.correlation(length_1), [0.6, 0.6])
+        self.assertTrue(total_1.covariance(length_2).match_units(si.Units.m ** 2))
+        np.testing.assert_allclose(total_1[1].covariance(length_2[1]).magnitude, 0.16)
+
+    def test_correlated_elements(self):
+        length_1 = si.UncertainArray([3.0, 6.0], [0.3, 0.4], exponents = {"length": 1}, track = True)
+        np.testing.assert_allclose((length_1[0] + length_1[1]).sigma, 0.5)
+        np.testing.assert_allclose((length_1[1] - length_1[1]).sigma, 0.0)
+        series_1 = si.UncertainArray([1.0, 2.0, 3.0], [0.1, 0.2, 0.3], track = True)
+        steps_1 = series_1[1:] - series_1[:-1]
+        np.testing.assert_allclose(steps_1.sigma, [np.hypot(0.1, 0.2), np.hypot(0.2, 0.3)])
+        np.testing.assert_allclose((series_1[1:] - series_1[1:]).sigma, [0.0, 0.0])
+        np.testing.assert_allclose(steps_1.covariance(series_1[1:]).magnitude, [0.04, 0.09])
+
+class TestTable(unittest.TestCase):
+    def test_table(self):
+        table_1 = si.QuantityTable({"time": si.QuantityArray([3.0, 1.0, 2.0, 4.0], exponents = {"time": 1}), \
+                                    "flow": si.QuantityArray([1.0, 2.0, 2.0, 5.0], exponents = {"length": 3, "time": -1}), \
+                                    "site": [1, 2, 1, 2]})
+        table_1 = table_1.derive(volume = lambda t: t["flow"] * t["time"])
+        self.assertTrue(table_1["volume"].match_units(si.Units.m ** 3))
+        with self.assertRaises(TypeError):
+            table_1.derive(wrong = lambda t: t["flow"] + t["time"])
+        with self.assertRaises(ValueError):
+            table_1["short"] = si.QuantityArray([1.0], exponents = {"time": 1})
+        self.assertEqual(table_1.sort("time")["volume"].magnitude.tolist(), [2.0, 4.0, 3.0, 20.0])
+        self.assertEqual(table_1.sort("site", "time", descending = True)["time"].magnitude.tolist(), [4.0, 1.0, 3.0, 2.0])
+        fast_1 = table_1.filter(table_1["flow"] > 1.5 * si.Units.m ** 3 / si.Units.s)
+        self.assertEqual(len(fast_1), 3)
+        self.assertEqual(fast_1.select("site", "time").columns, ["site", "time"])
+        self.assertEqual([len(chunk) for chunk in table_1.chunks(3)], [3, 1])
+
+    def test_group_by(self):
+        table_1 = si.QuantityTable.from_records([{"site": 2 * si.Units.m, "p": 3 * si.Units.Pa}, \
+                                                 {"site": 1 * si.Units.m, "p": 1 * si.Units.Pa}, \
+                                                 {"site": 2 * si.Units.m, "p": 5 * si.Units.Pa}])
+        groups_1 = table_1.group_by("site", {"total": ("p", "sum"), "n": ("p", "count"), "top": ("p", "max")})
+        self.assertEqual(groups_1["site"].magnitude.tolist(), [1.0, 2.0])
+        self.assertEqual(groups_1["total"].magnitude.tolist(), [1.0, 8.0])
+        self.assertEqual(groups_1["n"].magnitude.tolist(), [1.0, 2.0])
+        self.assertTrue(groups_1["top"].match_units(si.Units.Pa))
+        with si.format_context(["g", "m", "s", "A", "K", "mol"]):
+            self.assertEqual(str(groups_1).splitlines()[0].split(), ["site", "total", "n", "top"])
+            self.assertIn("g", str(groups_1).splitlines()[2])
+
+class TestNatural(unittest.TestCase):
+    def test_to_natural(self):
+        mass_1 = to_natural(si.Constants.me)
+        self.assertEqual(mass_1.exp, 1)
+        self.assertAlmostEqual(mass_1.magnitude / 1e6, 0.51099895, places = 6)
+        len_1 = to_natural(si.QuantityArray([1e-15, 2e-15], exponents = {"length": 1}))
+        self.assertEqual(len_1.exp, -1)
+        self.assertAlmostEqual(len_1.magnitude[1] * 1e9, 2 * 5.0677307, places = 5)
+        with self.assertRaises(ValueError):
+            to_natural(si.Units.A)
+
+    def test_to_si(self):
+        time_1 = si.QuantityArray([1.0, 2.5, 4.0], exponents = {"time": 1})
+        back_1 = to_si(to_natural(time_1), "s")
+        self.assertTrue(back_1.match_units(si.Units.s))
+        self.assertTrue(np.allclose(back_1.magnitude, time_1.magnitude))
+        self.assertAlmostEqual(to_si(1.0, si.Units.K).magnitude, 11604.518, places = 2)
+        with self.assertRaises(TypeError):
+            to_si(to_natural(si.Constants.me), "m")
+
+class TestBenchmark(unittest.TestCase):
+    def test_run_and_compare(self):
+        results_1 = benchmark.run(number = 10, repeat = 1, only = ["add", "str_custom"])
+        self.assertEqual(sorted(results_1), ["add", "str_custom"])
+        self.assertEqual(si.get_format(), ["kg", "m", "s", "A", "K", "mol"])
+        slower_1 = benchmark.compare({"add": 1e-6, "mul": 1e-6}, {"add": 2e-6, "mul": 1.1e-6})
+        self.assertEqual([name for name, old, new in slower_1], ["add"])
+
+    def test_import_is_lazy(self):
+        seconds_1, numpy_loaded_1 = benchmark.measure_import(repeat = 1)
+        self.assertFalse(numpy_loaded_1)
+
+class TestStats(unittest.TestCase):
+    def tearDown(self):
+        si_stats.disable()
+        si_stats.reset()
+
+    def test_counters(self):
+        si_stats.reset()
+        si_stats.enable()
+        speed_1 = 7 * si.Units.m / si.Units.s
+        str(speed_1)
+        with self.assertRaises(TypeError):
+            speed_1 + si.Units.m
+        si.new("3 km")
+        snapshot_1 = si_stats.snapshot()
+        self.assertEqual(snapshot_1["calls"]["SiUnitQuantity.__str__"], 1)
+        self.assertEqual(snapshot_1["errors"]["SiUnitQuantity.__add__"], 1)
+        self.assertEqual(snapshot_1["calls"]["si.new"], 1)
+        self.assertGreaterEqual(snapshot_1["allocations"]["SiUnitQuantity"], 3)
+        si_stats.disable()
+        self.assertFalse(si_stats.is_enabled())
+        self.assertNotIn("__wrapped__", dir(SiUnitQuantity.__add__))
+        str(speed_1)
+        self.assertEqual(si_stats.snapshot()["calls"]["SiUnitQuantity.__str__"], 1)
+
+    def test_dump(self):
+        stream_1 = io.StringIO()
+        si_stats.start_dump(stream_1, interval = 0.01)
+        time.sleep(0.05)
+        si_stats.stop_dump()
+        self.assertIn("unit_cache", json.loads(stream_1.getvalue().splitlines()[0]))
+
+class TestNewMany(unittest.TestCase):
+    def test_homogeneous(self):
+        parsed = si.new_many(["12.5 kPa", "13.1 kPa", "bad", "1 Pa", "7kPa"])
+        self.assertTrue(parsed.is_homogeneous())
+        self.assertTrue(parsed.values.match_units(si.Units.Pa))
+        self.assertEqual(parsed.values.magnitude[0], 12500.0)
+        self.assertEqual(parsed.values.magnitude[4], 7000.0)
+        self.assertEqual([row for row, message in parsed.errors], [2])
+
+    def test_mixed(self):
+        parsed = si.new_many(["1 m", "2 s", "3 km", "4 xyz"])
+        self.assertFalse(parsed.is_homogeneous())
+        rows, lengths = parsed.groups[si.Units.m.dimension]
+        self.assertEqual(list(rows), [0, 2])
+        self.assertEqual(list(lengths.magnitude), [1.0, 3000.0])
+        self.assertEqual([row for row, message in parsed.errors], [3])
+        with self.assertRaises(ValueError):
+            si.new_many(["1 m", "4 xyz"], strict = True)
+
+    def test_same_syntax_as_new(self):
+        with self.assertRaises(ValueError):
+            si.new("1_000 m")
+        parsed = si.new_many(["1_000 m", "2 m", "-inf m"])
+        self.assertEqual([row for row, message in parsed.errors], [0])
+        self.assertEqual(list(parsed.groups[si.Units.m.dimension][0]), [1, 2])
+        #non-strings are errors, not converted to strings
+        parsed = si.new_many([1.0, "2 m"])
+        self.assertEqual([row for row, message in parsed.errors], [0])
+        self.assertTrue(parsed.is_homogeneous())
+        self.assertTrue(parsed.values.match_units(si.Units.m))
+
+class TestStreaming(unittest.TestCase):
+    def test_read_chunks(self):
+        table_1 = io.StringIO("time [ms],pressure\n1,12.5 kPa\n2,13 kPa\n3,bad\n4,1 s\n5,3 Pa\n")
+        chunks = list(si_io.read_chunks(table_1, chunk_size = 2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertTrue(chunks[0].columns["time"].match_units(si.Units.s))
+        self.assertAlmostEqual(chunks[0].columns["time"].magnitude[1], 0.002)
+        self.assertTrue(chunks[1].columns["pressure"].match_units(si.Units.Pa))
+        self.assertEqual([error[0] for error in chunks[1].errors], [2, 3])
+        self.assertEqual(chunks[2].columns["pressure"].magnitude[0], 3.0)
+
+    def test_write_and_read_back(self):
+        force_1 = si.QuantityArray([1.5, 2.5], exponents = {"mass": 1, "length": 1, "time": -2})
+        table_1 = io.StringIO()
+        si.set_format(["kg", "m", "ms", "A", "K", "mol"])
+        try:
+            si_io.write_chunks(table_1, [{"force": force_1}])
+        finally:
+            si.set_default_format()
+        self.assertEqual(table_1.getvalue().splitlines()[0], "force [(kg * m)/ms^2]")
+        table_1.seek(0)
+        force_2 = next(si_io.read_chunks(table_1)).columns["force"]
+        self.assertTrue(force_2.match_units(force_1))
+        self.assertEqual(list(force_2.magnitude), [1.5, 2.5])
+
+class TestBinary(unittest.TestCase):
+    def test_write_and_map(self):
+        pressure_1 = si.QuantityArray(np.linspace(1e5, 2e5, 1001), exponents = {"mass": 1, "length": -1, "time": -2})
+        time_1 = si.QuantityArray(np.arange(6.0).reshape(2, 3), exponents = {"time": 1})
+        with tempfile.TemporaryDirectory() as directory:
+            path_1 = os.path.join(directory, "result.siq")
+            si_io.write_binary(path_1, {"p": pressure_1, "t": time_1, "m": 2 * si.Units.kg}, units = {"p": "kPa"})
+            table_1 = si_io.read_binary(path_1)
+            self.assertEqual(table_1.units, {"p": "kPa", "t": None, "m": None})
+            self.assertTrue(table_1["p"].match_units(si.Units.Pa))
+            self.assertIsInstance(table_1["p"].magnitude.base, np.memmap)
+            self.assertTrue(np.array_equal(table_1["p"][10:20].magnitude, pressure_1.magnitude[10:20]))
+            self.assertEqual(table_1["t"].shape, (2, 3))
+            self.assertEqual(float(table_1["m"].magnitude), 2.0)
+            del table_1
+            with self.assertRaises(TypeError):
+                si_io.write_binary(path_1, {"p": pressure_1}, units = {"p": "m"})
+
+def kinetic_energy(speed):
+    return 0.5 * (2 * si.Units.kg) * speed ** 2
+
+class TestParallel(unittest.TestCase):
+    def test_pickle(self):
+        speed_1 = 3 * si.Units.m / si.Units.s
+        loaded_1 = pickle.loads(pickle.dumps([speed_1, 4 * speed_1]))
+        self.assertTrue(loaded_1[1].match_units(speed_1))
+        self.assertEqual(loaded_1[1].magnitude, 12)
+        array_1 = pickle.loads(pickle.dumps(si.QuantityArray([1.0, 2.0], exponents = {"length": 1})))
+        self.assertIsInstance(array_1, si.QuantityArray)
+        self.assertTrue(array_1.match_units(si.Units.m))
+
+    def test_parallel_map(self):
+        speeds_1 = si.QuantityArray(np.arange(50.0), exponents = {"length": 1, "time": -1})
+        energies_1 = si.parallel_map(kinetic_energy, speeds_1, workers = 2)
+        self.assertEqual(len(energies_1), 50)
+        self.assertTrue(energies_1[7].match_units(si.Units.J))
+        self.assertAlmostEqual(energies_1[7].magnitude, 49.0)
+        mixed_1 = si.parallel_map(abs, [-2 * si.Units.m, si.Units.s], workers = 1)
+        self.assertTrue(mixed_1[1].match_units(si.Units.s))
+
+class TestCompile(unittest.TestCase):
+    def test_compile_string(self):
+        energy = si.compile("m * v**2 / 2", m = "g", v = "km/s")
+        self.assertTrue(energy.unit.match_units(si.Units.J))
+        self.assertAlmostEqual(energy(3.0, 2.0), 6000.0)
+        self.assertEqual(list(energy(np.array([1.0, 2.0]), np.array([1.0, 1.0]))), [500.0, 1000.0])
+        speed = si.compile("sqrt(G * M / r)", M = "kg", r = "km")
+        self.assertTrue(speed.unit.match_units(si.Units.m / si.Units.s))
+        with self.assertRaises(TypeError):
+            si.compile("v + t", v = "m/s", t = "s")
+        with self.assertRaises(ValueError):
+            si.compile("exp(t)", t = "s")
+        #inputs named like constants shadow them
+        distance = si.compile("c * t", c = "km/s", t = "s")
+        self.assertTrue(distance.unit.match_units(si.Units.m))
+        self.assertAlmostEqual(distance(2.0, 3.0), 6000.0)
+
+    def test_compile_callable(self):
+        distance = si.compile(lambda v, t: v * t, v = "m/s", t = "ms")
+        self.assertTrue(distance.unit.match_units(si.Units.m))
+        self.assertAlmostEqual(distance(2.0, 3.0), 0.006)
+        with self.assertRaises(TypeError):
+            si.compile(lambda x: x * si.Units.m, x = "m")
+
+class TestUnitsDecorator(unittest.TestCase):
+    def test_units(self):
+        @si.units(v = "m/s", t = "s", ret = "km")
+        def distance(v, t = si.Units.s):
+            return v * t
+
+        speed_1 = 3 * si.Units.m / si.Units.s
+        self.assertEqual(distance(speed_1, 2 * si.Units.s).magnitude, 6)
+        self.assertEqual(distance(t = 2 * si.Units.s, v = speed_1).magnitude, 6)
+        self.assertEqual(distance(speed_1).magnitude, 3)
+        with self.assertRaises(TypeError):
+            distance(3 * si.Units.m, 2 * si.Units.s)
+        with self.assertRaises(TypeError):
+            distance(speed_1, 2)
+
+    def test_units_return(self):
+        @si.units(x = "m", ret = "s")
+        def identity(x):
+            return x
+
+        with self.assertRaises(TypeError):
+            identity(si.Units.m)
+
+    def test_units_binding(self):
+        @si.units(x = "m")
+        def keyword_only(*args, x):
+            return x
+
+        self.assertIs(keyword_only(si.Units.s, 2 * si.Units.s, x = si.Units.m), si.Units.m)
+        with self.assertRaises(TypeError):
+            keyword_only(si.Units.m, x = si.Units.s)
+
+        @si.units(t = "s", limit = "m")
+        def wrong_default(t, limit = 5):
+            return t
+
+        with self.assertRaises(TypeError):
+            wrong_default(si.Units.s)
+        self.assertIs(wrong_default(si.Units.s, limit = si.Units.m), si.Units.s)
+
+        @si.units(times = "s")
+        def total(*times):
+            return times
+
+        total(si.Units.s, 2 * si.Units.s)
+        with self.assertRaises(TypeError):
+            total(si.Units.s, si.Units.m)
+
+        @si.units(options = "m")
+        def lengths(**options):
+            return options
+
+        lengths(a = si.Units.m, b = si.Units.m)
+        with self.assertRaises(TypeError):
+            lengths(a = si.Units.m, b = si.Units.s)
+
 if __name__ == "__main__":
     unittest.main(verbosity = 2)
@@ -0,0 +1,218 @@
+import numpy as np
+
+from si_class import SiUnitQuantity, DIMENSIONLESS
+from array_class import QuantityArray
+
+#Columnar table of quantities: every column is a QuantityArray, one dimension vector with a contiguous
+#1-D float64 buffer, instead of a SiUnitQuantity object per cell. Derived columns are ordinary
+#QuantityArray arithmetics, so the units are checked once per column:
+#    table = QuantityTable({"time": times, "flow": flows})
+#    table = table.derive(volume = lambda t: t["flow"] * t["time"])
+#    table.filter(table["flow"] > 2 * si.Units.m ** 3 / si.Units.s).sort("time")
+#Selections, filters and sorts return new tables, column buffers are shared where NumPy gives views.
+
+_AGGREGATIONS = ("sum", "mean", "min", "max", "std", "count")
+
+
+def _column(values):
+    if isinstance(values, SiUnitQuantity):
+        magnitude, dimension = values.magnitude, values._dim
+    else:
+        magnitude, dimension = values, DIMENSIONLESS
+    magnitude = np.ascontiguousarray(magnitude, dtype = np.float64)
+    if magnitude.ndim != 1:
+        raise ValueError("Table columns have to be one dimensional.")
+    return QuantityArray.from_dimension(magnitude, dimension)
+
+
+class QuantityTable:
+    __slots__ = ("_columns", "_length")
+
+    #columns: {name: QuantityArray, SiUnitQuantity or sequence of plain numbers (unitless)}.
+    #A scalar quantity is repeated for every row.
+    def __init__(self, columns = None):
+        self._columns = {}
+        self._length = None
+        scalars = {}
+        for name, values in (columns or {}).items():
+            if np.ndim(values.magnitude if isinstance(values, SiUnitQuantity) else values) == 0:
+                scalars[name] = values
+            else:
+                self[name] = values
+        for name, value in scalars.items():
+            self[name] = value
+
+    #builds a table from a list of {name: SiUnitQuantity} rows, all rows need the same keys and units
+    @classmethod
+    def from_records(cls, records):
+        records = list(records)
+        if len(records) == 0:
+            return cls()
+        return cls({name: QuantityArray.from_quantities(record[name] for record in records) for name in records[0]})
+
+    @classmethod
+    def _from_columns(cls, columns, length):
+        table = object.__new__(cls)
+        table._columns = columns
+        table._length = length
+        return table
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    #{name: dimension vector} of the columns
+    @property
+    def dimensions(self):
+        return {name: column.dimension for name, column in self._columns.items()}
+
+    def __len__(self):
+        return self._length or 0
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    #a column name gives the QuantityArray, a list of names a table of these columns,
+    #a slice, an index array or a boolean mask a table of these rows
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self._columns[key]
+        if isinstance(key, list) and all(isinstance(name, str) for name in key):
+            return self.select(*key)
+        return self.take(key)
+
+    def __setitem__(self, name, values):
+        column = values
+        if isinstance(values, SiUnitQuantity) and np.ndim(values.magnitude) == 0:
+            if self._length is None:
+                raise ValueError("Can not find the length of a table without columns.")
+            column = QuantityArray.from_dimension(np.full(self._length, values.magnitude, dtype = np.float64), values._dim)
+        column = _column(column)
+        if self._length is None:
+            self._length = len(column)
+        elif len(column) != self._length:
+            raise ValueError("Columns of different lengths.")
+        self._columns[name] = column
+
+    def __delitem__(self, name):
+        del self._columns[name]
+
+    def __eq__(self, other):
+        if not isinstance(other, QuantityTable) or self.columns != other.columns or len(self) != len(other):
+            return False
+        return all(column.dimension is other[name].dimension and np.array_equal(column.magnitude, other[name].magnitude) \
+                   for name, column in self._columns.items())
+
+    __hash__ = None
+
+    #new table with the columns computed by the functions, each called with the table:
+    #    table.derive(power = lambda t: t["flow"] * t["pressure"])
+    #later columns can use the earlier ones
+    def derive(self, **functions):
+        table = QuantityTable._from_columns(dict(self._columns), self._length)
+        for name, function in functions.items():
+            table[name] = function(table)
+        return table
+
+    def select(self, *names):
+        return QuantityTable._from_columns({name: self._columns[name] for name in names}, self._length)
+
+    def drop(self, *names):
+        return QuantityTable._from_columns({name: column for name, column in self._columns.items() if name not in names}, \
+                                           self._length)
+
+    def rename(self, names):
+        return QuantityTable._from_columns({names.get(name, name): column for name, column in self._columns.items()}, \
+                                           self._length)
+
+    #rows by a slice, an array of indices or a boolean mask, a single index gives a table of one row
+    def take(self, rows):
+        if isinstance(rows, (int, np.integer)):
+            rows = [rows]
+        columns = {name: QuantityArray.from_dimension(column.magnitude[rows], column.dimension) \
+                   for name, column in self._columns.items()}
+        length = len(next(iter(columns.values()))) if columns else 0
+        return QuantityTable._from_columns(columns, length)
+
+    #rows where mask is True. mask is a boolean array, such as table["p"] > 1 * si.Units.bar,
+    #or a function of the table returning one
+    def filter(self, mask):
+        if callable(mask):
+            mask = mask(self)
+        mask = np.asarray(mask)
+        if mask.dtype != np.bool_ or mask.shape != (len(self), ):
+            raise ValueError("Needs a boolean mask with one value for every row.")
+        return self.take(mask)
+
+    #rows ordered by one or more columns, the first name is the primary key. The sort is stable.
+    def sort(self, *names, descending = False):
+        if not names:
+            raise ValueError("Needs a column to sort by.")
+        keys = [self._columns[name].magnitude for name in reversed(names)]
+        order = np.lexsort([-magnitude for magnitude in keys] if descending else keys)
+        return self.take(order)
+
+    #one row per distinct value of the key column, with the aggregations
+    #    {output name: (column name, "sum" | "mean" | "min" | "max" | "std" | "count")}
+    #computed over the rows of each group. The key column comes first, in ascending order.
+    def group_by(self, key, aggregations):
+        for name, (column, how) in aggregations.items():
+            if how not in _AGGREGATIONS:
+                raise ValueError("Unknown aggregation " + repr(how) + ".")
+        keys = self._columns[key]
+        order = np.argsort(keys.magnitude, kind = "stable")
+        sorted_keys = keys.magnitude[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]) if len(order) else np.zeros(0, dtype = int)
+        counts = np.diff(np.r_[starts, len(order)])
+
+        columns = {key: QuantityArray.from_dimension(sorted_keys[starts], keys.dimension)}
+        for name, (column, how) in aggregations.items():
+            if how == "count":
+                columns[name] = QuantityArray.from_dimension(counts.astype(np.float64), DIMENSIONLESS)
+                continue
+            source = self._columns[column]
+            values = source.magnitude[order]
+            dimension = source.dimension
+            if len(starts) == 0:
+                result = np.zeros(0)
+            elif how == "sum":
+                result = np.add.reduceat(values, starts)
+            elif how == "mean":
+                result = np.add.reduceat(values, starts) / counts
+            elif how == "min":
+                result = np.minimum.reduceat(values, starts)
+            elif how == "max":
+                result = np.maximum.reduceat(values, starts)
+            else:
+                means = np.add.reduceat(values, starts) / counts
+                deviations = values - np.repeat(means, counts)
+                result = np.sqrt(np.add.reduceat(deviations * deviations, starts) / counts)
+            columns[name] = QuantityArray.from_dimension(result, dimension)
+        return QuantityTable._from_columns(columns, len(starts))
+
+    #tables of at most size rows each, views of the column buffers
+    def chunks(self, size):
+        if size < 1:
+            raise ValueError("Needs a positive chunk size.")
+        for start in range(0, len(self), size):
+            yield self.take(slice(start, start + size))
+
+    #{name: SiUnitQuantity} for every row, for code written against lists of dicts
+    def rows(self):
+        names = self.columns
+        for index in range(len(self)):
+            yield {name: self._columns[name][index] for name in names}
+
+    #{name: list of strings} of the cells in the active output format
+    def to_strings(self, precision = None, auto_prefix = None):
+        import si
+        return {name: si.format_many(column, precision, auto_prefix) for name, column in self._columns.items()}
+
+    def __str__(self):
+        cells = self.to_strings()
+        lines = []
+        widths = [max([len(str(name))] + [len(cell) for cell in cells[name]]) for name in cells]
+        lines.append("  ".join(str(name).rjust(width) for name, width in zip(cells, widths)))
+        for index in range(len(self)):
+            lines.append("  ".join(cells[name][index].rjust(width) for name, width in zip(cells, widths)))
+        return "\n".join(lines)
@@ -0,0 +1,239 @@
+import itertools
+
+import numpy as np
+
+from si_class import SiUnitQuantity, DIMENSIONLESS, dimension_product, intern_dimension, compiled_format
+from array_class import QuantityArray
+
+#Arrays of quantities with first-order (linear) uncertainties. Values and units come from the
+#QuantityArray operators, sigma follows from the derivatives of every operation, all vectorized.
+#
+#By default the operands of an operation are taken as independent: x + y has
+#sigma = sqrt(sigma_x^2 + sigma_y^2). With track = True every element of an array is an independent
+#measurement, and results remember how they depend on them as a sparse Jacobian: a list of terms
+#(source, coefficient, index, source sigma), where element i of the result depends on element
+#index[i] of the source with the given coefficient[i]. The covariance of any two results follows from
+#the terms that share source elements, so x - x and x[1:] - x[1:] have no uncertainty, while
+#x[0] + x[1] and x[1:] - x[:-1] combine different, independent elements.
+
+_SOURCES = itertools.count()
+
+
+def _raw(value):
+    if isinstance(value, SiUnitQuantity):
+        return value.magnitude
+    return value
+
+
+class UncertainArray(QuantityArray):
+    __slots__ = ("sigma", "_terms", "_source")
+
+    #NumPy functions would drop sigma, so they are refused; ndarray op UncertainArray uses the reflected operators
+    __array_ufunc__ = None
+
+    def __init__(self, magnitude = (), sigma = 0.0, exponents = None, track = False):
+        QuantityArray.__init__(self, magnitude, exponents)
+        self.sigma = np.broadcast_to(np.asarray(sigma, dtype = float), self.magnitude.shape).copy()
+        self._source = None
+        self._terms = self._own_terms() if track else None
+
+    #builds an array from a quantity and its sigma, a quantity of the same units or numbers in basic SI units
+    @classmethod
+    def from_quantity(cls, quantity, sigma, track = False):
+        if isinstance(sigma, SiUnitQuantity):
+            if sigma._dim is not quantity._dim:
+                raise TypeError("Unit mismatch between a SiUnitQuantity and its uncertainty")
+            sigma = sigma.magnitude
+        return cls(quantity.magnitude, sigma, quantity._dim, track)
+
+    @classmethod
+    def _make(cls, magnitude, dimension, sigma, terms):
+        array = object.__new__(cls)
+        array.magnitude = np.asarray(magnitude, dtype = float)
+        array._dim = dimension
+        array.sigma = np.broadcast_to(sigma, array.magnitude.shape).copy()
+        array._terms = terms
+        array._source = None
+        return array
+
+    def __reduce__(self):
+        #correlations are not kept across pickling
+        return _restore, (type(self), self.magnitude, self.sigma, self._dim)
+
+    def is_tracked(self):
+        return self._terms is not None
+
+    #this array as independent measurements, one for every element
+    def _own_terms(self):
+        if self._source is None:
+            self._source = next(_SOURCES)
+        shape = self.magnitude.shape
+        return [(self._source, np.ones(shape), np.arange(self.sigma.size).reshape(shape), self.sigma.ravel().copy())]
+
+    def _terms_for_tracking(self):
+        return self._terms if self._terms is not None else self._own_terms()
+
+    def __array_function__(self, func, types, args, kwargs):
+        return NotImplemented
+
+    def value(self):
+        return QuantityArray.from_dimension(self.magnitude, self._dim)
+
+    def uncertainty(self):
+        return QuantityArray.from_dimension(self.sigma, self._dim)
+
+    #elementwise covariance with another array computed from tracked measurements
+    def covariance(self, other):
+        shape = np.broadcast_shapes(self.magnitude.shape, other.magnitude.shape)
+        result = _covariance(self._terms_for_tracking(), other._terms_for_tracking(), shape)
+        return QuantityArray.from_dimension(result, dimension_product(self._dim, other._dim))
+
+    def correlation(self, other):
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            return self.covariance(other).magnitude / (self.sigma * other.sigma)
+
+    def copy(self):
+        terms = None if self._terms is None else list(self._terms)
+        return UncertainArray._make(self.magnitude.copy(), self._dim, self.sigma, terms)
+
+    def __getitem__(self, index):
+        shape = self.magnitude.shape
+        terms = self._terms
+        #an untracked array already used in tracked results keeps its source in its elements
+        if terms is None and self._source is not None:
+            terms = self._own_terms()
+        if terms is not None:
+            terms = [(source, np.broadcast_to(coefficient, shape)[index], np.broadcast_to(elements, shape)[index], sigma) \
+                     for source, coefficient, elements, sigma in terms]
+        return UncertainArray._make(self.magnitude[index], self._dim, self.sigma[index], terms)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __setitem__(self, index, value):
+        if self._terms is not None:
+            raise TypeError("Can not assign into a tracked UncertainArray")
+        QuantityArray.__setitem__(self, index, value)
+        self.sigma[index] = value.sigma if isinstance(value, UncertainArray) else 0.0
+
+    def __str__(self):
+        divisors, suffix = compiled_format().render(self._dim)
+        magnitude = self.magnitude
+        sigma = self.sigma
+        for divisor in divisors:
+            magnitude = magnitude / divisor
+            sigma = sigma / abs(divisor)
+        return str(magnitude) + " +/- " + str(sigma) + suffix
+
+
+    #arithmetics, the values and units come from QuantityArray, parts are (operand, derivative)
+    def __add__(self, right):
+        return _propagate(QuantityArray.__add__(self, right), ((self, 1.0), (right, 1.0)))
+
+    def __radd__(self, left):
+        return self + left
+
+    def __sub__(self, right):
+        return _propagate(QuantityArray.__sub__(self, right), ((self, 1.0), (right, -1.0)))
+
+    def __rsub__(self, left):
+        return _propagate(QuantityArray.__rsub__(self, left), ((left, 1.0), (self, -1.0)))
+
+    def __mul__(self, right):
+        return _propagate(QuantityArray.__mul__(self, right), ((self, _raw(right)), (right, self.magnitude)))
+
+    def __rmul__(self, left):
+        return _propagate(QuantityArray.__rmul__(self, left), ((left, self.magnitude), (self, _raw(left))))
+
+    def __truediv__(self, right):
+        denominator = _raw(right)
+        return _propagate(QuantityArray.__truediv__(self, right), \
+                          ((self, 1.0 / denominator), (right, -self.magnitude / denominator ** 2)))
+
+    def __rtruediv__(self, left):
+        return _propagate(QuantityArray.__rtruediv__(self, left), \
+                          ((left, 1.0 / self.magnitude), (self, -_raw(left) / self.magnitude ** 2)))
+
+    def __pow__(self, right):
+        if isinstance(right, UncertainArray):
+            raise ValueError("Needs an exact power for an UncertainArray.")
+        power = _raw(right)
+        return _propagate(QuantityArray.__pow__(self, right), ((self, power * self.magnitude ** (power - 1)), ))
+
+    def __rpow__(self, left):
+        result = QuantityArray.__rpow__(self, left)
+        if not isinstance(result, SiUnitQuantity):
+            result = QuantityArray.from_dimension(np.asarray(result, dtype = float), DIMENSIONLESS)
+        return _propagate(result, ((self, result.magnitude * np.log(_raw(left))), ))
+
+    #in place operators would keep the old sigma, so these fall back to the operators above
+    def __iadd__(self, right):
+        return NotImplemented
+
+    def __isub__(self, right):
+        return NotImplemented
+
+    def __imul__(self, right):
+        return NotImplemented
+
+    def __itruediv__(self, right):
+        return NotImplemented
+
+    def __neg__(self):
+        return _propagate(QuantityArray.__neg__(self), ((self, -1.0), ))
+
+    def __pos__(self):
+        return self.copy()
+
+    def __abs__(self):
+        return _propagate(QuantityArray.__abs__(self), ((self, np.sign(self.magnitude)), ))
+
+
+#attaches the propagated uncertainty to the result of an operation
+def _propagate(result, parts):
+    #the same array appearing twice (x * x) is one operand with the summed derivative
+    merged = {}
+    for operand, derivative in parts:
+        if isinstance(operand, UncertainArray):
+            if id(operand) in merged:
+                merged[id(operand)][1] = merged[id(operand)][1] + derivative
+            else:
+                merged[id(operand)] = [operand, derivative]
+
+    if not any(operand._terms is not None for operand, derivative in merged.values()):
+        variance = 0.0
+        for operand, derivative in merged.values():
+            variance = variance + (derivative * operand.sigma) ** 2
+        return UncertainArray._make(result.magnitude, result._dim, np.sqrt(variance), None)
+
+    shape = result.magnitude.shape
+    terms = []
+    for operand, derivative in merged.values():
+        for source, coefficient, elements, sigma in operand._terms_for_tracking():
+            coefficient = np.broadcast_to(derivative * coefficient, shape)
+            elements = np.broadcast_to(elements, shape)
+            #terms on the same elements of a source are one term, so x - x cancels
+            for position, (other, other_coefficient, other_elements, other_sigma) in enumerate(terms):
+                if other == source and np.array_equal(other_elements, elements):
+                    terms[position] = (source, other_coefficient + coefficient, other_elements, sigma)
+                    break
+            else:
+                terms.append((source, coefficient, elements, sigma))
+    variance = np.maximum(_covariance(terms, terms, shape), 0.0)
+    return UncertainArray._make(result.magnitude, result._dim, np.sqrt(variance), terms)
+
+
+#elementwise covariance of two arrays given by their terms: the products of the coefficients of
+#every pair of terms that meet on the same element of a source
+def _covariance(left, right, shape):
+    result = np.zeros(shape)
+    for source, coefficient, elements, sigma in left:
+        for other, other_coefficient, other_elements, other_sigma in right:
+            if other == source:
+                result = result + np.where(elements == other_elements, coefficient * other_coefficient, 0.0) * sigma[elements] ** 2
+    return result
+
+
+def _restore(cls, magnitude, sigma, dimension):
+    return cls._make(magnitude, intern_dimension(dimension), sigma, None)
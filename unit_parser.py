@@ -0,0 +1,149 @@
+import re
+
+from si_class import DIMENSIONLESS, dimension_product, dimension_quotient, dimension_power
+
+#Unit expressions like "kg*m^2/(s^2*A)" are tokenized in one pass, turned into a small AST by
+#a precedence (shunting-yard) parser and evaluated without recursion, so the work is O(n) in the
+#length of the string however long or deeply nested it is.
+#
+#AST nodes are tuples: ("number", value), ("unit", name), ("neg", node), ("*", left, right),
+#("/", left, right) and ("^", base, exponent). Exponents are numeric expressions: m^2, m^-1, m**(1/2).
+
+_TOKEN = re.compile(r"\s*(?:(\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)|([^\W\d]\w*)|(\*\*|[*/^()+-]))")
+
+#binding power of binary operators, "^" is right-associative
+_PRECEDENCE = {"*": 1, "/": 1, "neg": 2, "pos": 2, "^": 3}
+
+
+def _wrong_format():
+    return ValueError("String can not be converted to SI object: wrong format.")
+
+
+#splits the expression into ("number", float), ("name", str) and ("op", str) tokens
+def tokenize(expression):
+    tokens = []
+    pos = 0
+    end = len(expression)
+    while pos < end:
+        match = _TOKEN.match(expression, pos)
+        if match is None:
+            if expression[pos:].strip() == "":
+                break
+            raise _wrong_format()
+        number, name, operator = match.groups()
+        if number is not None:
+            tokens.append(("number", float(number)))
+        elif name is not None:
+            tokens.append(("name", name))
+        else:
+            tokens.append(("op", "^" if operator == "**" else operator))
+        pos = match.end()
+    return tokens
+
+
+#builds the AST of a unit expression, juxtaposed operands ("N m") are multiplied
+def parse(expression):
+    output = []
+    operators = []
+
+    def reduce_top():
+        operator = operators.pop()
+        if operator in ("neg", "pos"):
+            if not output:
+                raise _wrong_format()
+            operand = output.pop()
+            output.append(("neg", operand) if operator == "neg" else operand)
+            return
+        if len(output) < 2:
+            raise _wrong_format()
+        right = output.pop()
+        left = output.pop()
+        output.append((operator, left, right))
+
+    def push_binary(operator):
+        precedence = _PRECEDENCE[operator]
+        while operators and operators[-1] != "(":
+            top = _PRECEDENCE[operators[-1]]
+            if top > precedence or (top == precedence and operator != "^"):
+                reduce_top()
+            else:
+                break
+        operators.append(operator)
+
+    expect_operand = True
+    for kind, value in tokenize(expression):
+        if kind == "number" or kind == "name" or value == "(":
+            if not expect_operand:
+                push_binary("*")
+            if kind == "number":
+                output.append(("number", value))
+                expect_operand = False
+            elif kind == "name":
+                output.append(("unit", value))
+                expect_operand = False
+            else:
+                operators.append("(")
+                expect_operand = True
+        elif value == ")":
+            if expect_operand:
+                raise _wrong_format()
+            while operators and operators[-1] != "(":
+                reduce_top()
+            if not operators:
+                raise _wrong_format()
+            operators.pop()
+        elif expect_operand:
+            if value == "-":
+                operators.append("neg")
+            elif value == "+":
+                operators.append("pos")
+            else:
+                raise _wrong_format()
+        else:
+            #units can only be multiplied, divided and raised to a power
+            if value in ("+", "-"):
+                raise _wrong_format()
+            push_binary(value)
+            expect_operand = True
+
+    if expect_operand:
+        raise _wrong_format()
+    while operators:
+        if operators[-1] == "(":
+            raise _wrong_format()
+        reduce_top()
+    if len(output) != 1:
+        raise _wrong_format()
+    return output[0]
+
+
+#evaluates the AST to (scale, dimension), resolve(name) gives (scale, dimension) of a single unit
+def evaluate(tree, resolve):
+    values = []
+    stack = [(tree, False)]
+    while stack:
+        node, visited = stack.pop()
+        kind = node[0]
+        if kind == "number":
+            values.append((node[1], DIMENSIONLESS))
+        elif kind == "unit":
+            values.append(resolve(node[1]))
+        elif not visited:
+            stack.append((node, True))
+            for child in reversed(node[1:]):
+                stack.append((child, False))
+        elif kind == "neg":
+            scale, dimension = values.pop()
+            values.append((-scale, dimension))
+        else:
+            right_scale, right_dimension = values.pop()
+            left_scale, left_dimension = values.pop()
+            if kind == "*":
+                values.append((left_scale * right_scale, dimension_product(left_dimension, right_dimension)))
+            elif kind == "/":
+                values.append((left_scale / right_scale, dimension_quotient(left_dimension, right_dimension)))
+            else:
+                if right_dimension is not DIMENSIONLESS:
+                    raise ValueError('Needs unitless number for a power.')
+                values.append((left_scale ** right_scale, dimension_power(left_dimension, right_scale)))
+    return values[0]